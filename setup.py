@@ -52,7 +52,10 @@ setup(
     package_dir={'': 'src'},
     packages=['prique'],
     ext_modules=cythonize(
-        [Extension('prique.core', ['src/prique/core.py'])],
+        [
+            Extension('prique.core', ['src/prique/core.py']),
+            Extension('prique.numeric', ['src/prique/numeric.py']),
+        ],
         language_level='3',
     ),
     tests_require=['tox'],
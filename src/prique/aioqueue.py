@@ -0,0 +1,332 @@
+"""Prique asyncio Queue
+
+Priority queue for asyncio built on `core.Prique`.
+
+The interface follows `asyncio.PriorityQueue` but items are put as separate
+key and value arguments and got as (key, value) pairs. Batch methods
+`put_many` and `get_batch` wake waiting coroutines once per batch rather
+than once per item, and only as many waiters as the items added or removed
+will serve. When keys are timestamps, `get_due` sleeps until the smallest
+key is due and wakes early only when an earlier item arrives.
+
+"""
+
+import asyncio
+import collections
+
+from asyncio import QueueEmpty, QueueFull
+
+from .core import Prique
+
+__all__ = ['PriorityQueue', 'QueueEmpty', 'QueueFull']
+
+
+def _release(waiter):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+class PriorityQueue:
+    """Priority Queue
+
+    Items with the smallest key are got first. When `maxsize` is greater
+    than zero, puts wait while the queue is full. When `stable` is set,
+    items with equal keys are got in the order they were put, otherwise in
+    reverse order. Other keyword arguments are passed to `core.Prique.init`,
+    for example `handles=True` to return handles from put for use with
+    cancel and change. Maxlen is not supported, use maxsize to bound the
+    queue. Key functions are not supported, keys are passed to put.
+
+    """
+
+    def __init__(self, maxsize=0, stable=False, **options):
+        if options.get('maxlen'):
+            raise ValueError('maxlen is not supported')
+
+        if options.get('key') is not None:
+            raise ValueError('key is not supported')
+
+        self._maxsize = maxsize
+        self._stable = stable
+        self._prique = Prique()
+        self._prique.init(**options)
+        self._getters = collections.deque()
+        self._putters = collections.deque()
+        self._sleepers = collections.deque()
+        self._unfinished_tasks = 0
+        self._finished = asyncio.Event()
+        self._finished.set()
+
+    def __repr__(self):
+        return '<%s maxsize=%r qsize=%r>' % (
+            type(self).__name__, self._maxsize, self.qsize()
+        )
+
+    @property
+    def maxsize(self):
+        return self._maxsize
+
+    def qsize(self):
+        return self._prique.len()
+
+    def empty(self):
+        return not self._prique.len()
+
+    def full(self):
+        return 0 < self._maxsize <= self._prique.len()
+
+    def _wakeup_next(self, waiters, count=1):
+        # Wake waiters that are still waiting until their demand covers count
+        # items.
+
+        while count > 0 and waiters:
+            waiter, demand = waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                count -= demand
+
+    def _wakeup_all(self, waiters):
+        # Wake every waiter, used when the smallest key changes.
+
+        while waiters:
+            waiter, _ = waiters.popleft()
+            _release(waiter)
+
+    async def _wait(self, waiters, timeout=None, demand=1):
+        # Wait until woken or until timeout seconds elapse. Demand is the most
+        # items the caller takes or puts once woken. Callers recheck their
+        # condition after waiting.
+
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        entry = (waiter, demand)
+        waiters.append(entry)
+        timer = None
+
+        if timeout is not None:
+            timer = loop.call_later(timeout, _release, waiter)
+
+        try:
+            await waiter
+        finally:
+            if timer is not None:
+                timer.cancel()
+            try:
+                waiters.remove(entry)
+            except ValueError:
+                pass
+
+    def _added(self, count, new_min):
+        self._unfinished_tasks += count
+        self._finished.clear()
+        self._wakeup_next(self._getters, count)
+
+        if new_min:
+            self._wakeup_all(self._sleepers)
+
+    def _removed(self, count):
+        self._wakeup_next(self._putters, count)
+
+    def put_nowait(self, key, value):
+        "Put item into queue without waiting and return its handle, if any."
+        prique = self._prique
+
+        if self.full():
+            raise QueueFull
+
+        new_min = not prique.len() or key < prique.peekitem(0)[0]
+
+        if self._stable:
+            handle = prique.add_right(key, value)
+        else:
+            handle = prique.add_left(key, value)
+
+        self._added(1, new_min)
+        return handle
+
+    async def put(self, key, value):
+        "Put item into queue and return its handle, if any."
+        while self.full():
+            try:
+                await self._wait(self._putters)
+            except asyncio.CancelledError:
+                if not self.full():
+                    self._wakeup_next(self._putters)
+                raise
+
+        return self.put_nowait(key, value)
+
+    async def put_many(self, items):
+        """Put (key, value) pairs from items into queue.
+
+        Pairs are added in batches that fill the available room. Each batch
+        wakes getters only until their demand covers the items added. When
+        stable, pairs are added one at a time after items with equal keys.
+
+        """
+        items = list(items)
+        prique = self._prique
+        start = 0
+
+        while start < len(items):
+            while self.full():
+                try:
+                    await self._wait(self._putters, demand=len(items) - start)
+                except asyncio.CancelledError:
+                    if not self.full():
+                        self._wakeup_next(self._putters, len(items) - start)
+                    raise
+
+            if self._maxsize > 0:
+                stop = start + self._maxsize - prique.len()
+            else:
+                stop = len(items)
+
+            batch = items[start:stop]
+            old_min = prique.peekitem(0)[0] if prique.len() else None
+
+            if self._stable:
+                add_right = prique.add_right
+                for key, value in batch:
+                    add_right(key, value)
+            else:
+                prique.update(batch)
+
+            new_min = old_min is None or prique.peekitem(0)[0] < old_min
+            self._added(len(batch), new_min)
+            start += len(batch)
+
+    def get_nowait(self):
+        "Remove and return (key, value) pair with smallest key without waiting."
+        prique = self._prique
+
+        if not prique.len():
+            raise QueueEmpty
+
+        item = prique.popitem(0)
+        self._removed(1)
+        return item
+
+    async def get(self):
+        "Remove and return (key, value) pair with the smallest key."
+        while self.empty():
+            try:
+                await self._wait(self._getters)
+            except asyncio.CancelledError:
+                if not self.empty():
+                    self._wakeup_next(self._getters)
+                raise
+
+        return self.get_nowait()
+
+    def _pop(self, max_items, max_key=None):
+        # Pop up to max_items pairs with keys no greater than max_key.
+
+        prique = self._prique
+        items = []
+
+        while prique.len() and len(items) < max_items:
+            if max_key is not None and max_key < prique.peekitem(0)[0]:
+                break
+            items.append(prique.popitem(0))
+
+        if items:
+            self._removed(len(items))
+
+        return items
+
+    async def get_batch(self, max_items, timeout=None):
+        """Remove and return up to max_items pairs with the smallest keys.
+
+        Waits until at least one item is available and returns as many as
+        are available up to max_items. Returns an empty list if `timeout`
+        seconds elapse first.
+
+        """
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+
+        while self.empty():
+            remaining = None
+
+            if deadline is not None:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return []
+
+            try:
+                await self._wait(self._getters, remaining, max_items)
+            except asyncio.CancelledError:
+                if not self.empty():
+                    self._wakeup_next(self._getters, max_items)
+                raise
+
+        return self._pop(max_items)
+
+    async def get_due(self, max_items=1, clock=None):
+        """Wait until items are due and return up to max_items of them.
+
+        Keys are compared with the current time from `clock`, by default the
+        event loop's clock. Sleeps until the smallest key is due, waking
+        early only when an item with a smaller key is put.
+
+        """
+        loop = asyncio.get_running_loop()
+
+        if clock is None:
+            clock = loop.time
+
+        prique = self._prique
+
+        while True:
+            delay = None
+
+            if prique.len():
+                now = clock()
+                delay = prique.peekitem(0)[0] - now
+
+                if delay <= 0:
+                    return self._pop(max_items, now)
+
+            await self._wait(self._sleepers, delay)
+
+    def peek(self):
+        "Return (key, value) pair with the smallest key without removing it."
+        if not self._prique.len():
+            raise QueueEmpty
+        return self._prique.peekitem(0)
+
+    def cancel(self, handle):
+        "Remove item by handle and return its (key, value) pair."
+        item = self._prique.remove(handle)
+        self.task_done()
+        self._removed(1)
+        return item
+
+    def change(self, handle, key):
+        "Change key of item by handle."
+        prique = self._prique
+        new_min = prique.len() and key < prique.peekitem(0)[0]
+        prique.change(handle, key, self._stable)
+
+        if new_min:
+            self._wakeup_all(self._sleepers)
+
+        return handle
+
+    def irange(self, min_key=None, max_key=None, exc_min=False, exc_max=False):
+        "Return list of pairs with keys between min key and max key."
+        return list(self._prique.irange(min_key, max_key, exc_min, exc_max))
+
+    def task_done(self):
+        if self._unfinished_tasks <= 0:
+            raise ValueError('task_done() called too many times')
+
+        self._unfinished_tasks -= 1
+
+        if self._unfinished_tasks == 0:
+            self._finished.set()
+
+    async def join(self):
+        if self._unfinished_tasks > 0:
+            await self._finished.wait()
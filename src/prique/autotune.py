@@ -0,0 +1,108 @@
+"""Prique Autotune
+
+Measure throughput of `core.Prique` for several leaf sizes on a sample
+workload and recommend the fastest load.
+
+The best load depends on the cost of comparing keys and the mix of
+operations. Cheap keys like ints favor larger leafs while expensive keys like
+tuples favor smaller leafs and fewer comparisons per bisect.
+
+"""
+
+import random
+import time
+
+from .core import Prique
+
+LOADS = (16, 24, 32, 40, 48, 64, 96, 128)
+
+
+def measure(items, load, ranges=100):
+    "Return seconds spent on insert, range and pop operations for load."
+    items = list(items)
+    keys = sorted(item[0] for item in items)
+    rand = random.Random(0)
+    timer = time.perf_counter
+
+    prique = Prique()
+    prique.init(load=load)
+    add_left = prique.add_left
+
+    start = timer()
+    for key, value in items:
+        add_left(key, value)
+    insert = timer() - start
+
+    bounds = []
+    for _ in range(ranges):
+        low = rand.randrange(len(keys))
+        high = min(low + 100, len(keys) - 1)
+        bounds.append((keys[low], keys[high]))
+
+    irange = prique.irange
+
+    start = timer()
+    for min_key, max_key in bounds:
+        for _ in irange(min_key, max_key):
+            pass
+    range_ = timer() - start
+
+    popitem = prique.popitem
+
+    start = timer()
+    for index in range(len(items)):
+        popitem(-(index & 1))
+    pop = timer() - start
+
+    return {'insert': insert, 'range': range_, 'pop': pop}
+
+
+def autotune(items, loads=LOADS, weights=None, repeat=3):
+    """Recommend load for items.
+
+    The `items` are (key, value) pairs representative of the workload. Each
+    load in `loads` is measured `repeat` times and the fastest run is kept.
+    The `weights` mapping scales the time of the "insert", "range" and "pop"
+    operations to match the read/write mix of the workload.
+
+    Returns pair of recommended load and mapping of load to timings.
+
+    """
+    items = list(items)
+
+    if not items:
+        raise ValueError('items must not be empty')
+
+    if weights is None:
+        weights = {'insert': 1, 'range': 1, 'pop': 1}
+
+    results = {}
+
+    for load in loads:
+        runs = [measure(items, load) for _ in range(repeat)]
+        results[load] = {
+            name: min(run[name] for run in runs) for name in runs[0]
+        }
+
+    def score(load):
+        timings = results[load]
+        return sum(weights.get(name, 0) * timings[name] for name in timings)
+
+    best = min(results, key=score)
+    return best, results
+
+
+if __name__ == '__main__':
+    rand = random.Random(0)
+    values = list(range(100_000))
+    rand.shuffle(values)
+    samples = {
+        'int': [(value, value) for value in values],
+        'tuple': [((value % 100, str(value)), value) for value in values],
+    }
+
+    for name, items in samples.items():
+        best, results = autotune(items)
+        print(name, 'load:', best)
+        for load, timings in results.items():
+            print('   ', load, timings)
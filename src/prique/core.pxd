@@ -2,40 +2,163 @@ import cython
 
 
 cdef int MAX_LEAF_SIZE
-cdef int MAX_LEAF_SIZE_SUB1
-cdef int MAX_LEAF_SIZE_DIV2
-cdef int MAX_LEAF_SIZE_MUL2
-cdef int MIN_LEAF_SIZE
-cdef int AVG_LEAF_SIZE
+cdef enum:
+    COUNTERS = 0
+cdef int POOL_SIZE
+cdef long _splits
+cdef long _pivots_left
+cdef long _pivots_right
+cdef long _comparisons
+cdef long _descents
+cdef long _allocations
 
 
 cdef int bisect_left(list values, object value)
 
+cdef int bisect_right(list values, object value)
+
 
 cdef class Branch:
     cdef Branch _parent
     cdef int _total
     cdef object _max
-    cdef object _left
-    cdef object _right
+    cdef Branch _left
+    cdef Branch _right
 
 
 cdef class Leaf(Branch):
     cdef list _keys
     cdef list _values
+    cdef list _handles
+
+
+cdef class Handle:
+    cdef Leaf _leaf
 
 
 cdef class Prique:
     cdef Branch _tree
+    cdef Leaf _head
+    cdef Leaf _tail
+    cdef int _max_leaf_size
+    cdef int _max_leaf_size_sub1
+    cdef int _max_leaf_size_div2
+    cdef int _max_leaf_size_mul2
+    cdef int _min_leaf_size
+    cdef int _avg_leaf_size
+    cdef dict _lookup
+    cdef int _maxlen
+    cdef object _key
+    cdef list _free_leafs
+    cdef list _free_branches
+
+    cpdef init(self, object items=*, int load=*, bint handles=*, bint indexed=*,
+               int maxlen=*, object key=*)
+
+    cpdef init_sorted(self, list keys, list values, int load=*, bint handles=*,
+                      bint indexed=*, int maxlen=*, object key=*)
+
+    cpdef tuple dump(self)
+
+    cdef _load(self, list keys, list values, list handles)
+
+    cdef Branch _build(self, list leafs, int start, int stop)
+
+    cpdef add_left(self, object key, object value)
+
+    cpdef add_right(self, object key, object value)
+
+    cdef _add(self, object key, object value, bint right)
+
+    cpdef push_left(self, object value)
+
+    cpdef push_right(self, object value)
+
+    cdef _relocate(self, Leaf leaf, int start, int stop)
+
+    cdef tuple _find(self, object key, object value)
+
+    cpdef bint discard(self, object key, object value)
+
+    cpdef bint discard_value(self, object value)
+
+    cpdef bint contains(self, object key, object value)
+
+    cpdef int index(self, object key, object value) except -1
+
+    cpdef int count(self, object key, object value)
+
+    cpdef remove(self, Handle handle)
+
+    cpdef change(self, Handle handle, object key=*, bint right=*)
+
+    cpdef peekitem(self, int index=*)
+
+    cpdef popitem(self, int index=*)
+
+    cpdef list popto(self, object max_key, bint exc_max=*)
 
-    cpdef init(self)
+    cpdef int delete_range(self, object min_key=*, object max_key=*,
+                           bint exc_min=*, bint exc_max=*) except -1
 
-    cpdef int add_left(self, object key, object value)
+    cpdef getitem(self, int index)
 
-    cpdef int discard(self, object key, object value)
+    cpdef delitem(self, int index)
+
+    cdef tuple _locate(self, int index)
+
+    cdef Leaf _seek(self, object key, bint right)
+
+    cdef int _rank(self, object key, bint right) except -1
+
+    cpdef int bisect_left(self, object key) except -1
+
+    cpdef int bisect_right(self, object key) except -1
+
+    cdef tuple _bounds(self, object min_key, object max_key, bint exc_min,
+                       bint exc_max)
+
+    cpdef int count_range(self, object min_key=*, object max_key=*,
+                          bint exc_min=*, bint exc_max=*) except -1
 
     cpdef int len(self)
 
+    cpdef dict stats(self)
+
+    cdef _remove(self, Leaf leaf, int index)
+
+    cdef Branch _merge(self, Leaf leaf)
+
+    cdef _rebalance(self, Leaf leaf)
+
+    cdef _unlink(self, Leaf leaf)
+
+    cdef Branch _new_branch(self)
+
+    cdef Leaf _new_leaf(self, bint handles)
+
+    cdef _retire(self, Branch node)
+
+    cdef _propagate_max(self, Branch node)
+
+    cdef _update_total(self, Branch branch, int delta)
+
+    cpdef update(self, object items)
+
+    cdef Leaf _splice(self, Leaf leaf, list pairs, int start, int stop)
+
+    cpdef Prique split(self, object key)
+
+    cdef Prique _cut(self, int index)
+
+    cdef _partition(self, dict lookup, Prique other)
+
+    cpdef join(self, Prique other)
+
+    cdef _concat(self, Prique left, Prique right)
+
+    cdef _join(self, Branch left, Branch right)
+
     cdef _pivot_left(self, Branch branch)
 
     cdef _pivot_right(self, Branch branch)
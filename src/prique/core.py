@@ -11,26 +11,81 @@ Swap position of (key, value) in APIs?
 
 import cython
 
+from operator import itemgetter
+from sys import getsizeof
+
 MAX_LEAF_SIZE = 40
 
+# Set COUNTERS to count splits, pivots, comparisons, descents and node
+# allocations. Counting is off by default. Compiled builds declare COUNTERS
+# as a constant in core.pxd so counting compiles away; change it there and
+# rebuild to enable it.
+
+if not cython.compiled:
+    COUNTERS = False
+
+# Limit of unlinked leafs and branches kept by each prique for reuse.
+
+POOL_SIZE = 64
+
 # class Cython:
 #     def cast(self, kind, value):
 #         return value
 # cython = Cython()
 # MAX_LEAF_SIZE = 8
 
-MAX_LEAF_SIZE_SUB1 = MAX_LEAF_SIZE - 1
-MAX_LEAF_SIZE_DIV2 = MAX_LEAF_SIZE >> 1
-MAX_LEAF_SIZE_MUL2 = MAX_LEAF_SIZE << 1
-MIN_LEAF_SIZE = MAX_LEAF_SIZE >> 2
-AVG_LEAF_SIZE = MIN_LEAF_SIZE + (MAX_LEAF_SIZE - MIN_LEAF_SIZE) >> 1
+
+_splits = 0
+_pivots_left = 0
+_pivots_right = 0
+_comparisons = 0
+_descents = 0
+_allocations = 0
+
+
+def counters():
+    "Return mapping of counter names to counts since last reset."
+    return {
+        'splits': _splits,
+        'pivots_left': _pivots_left,
+        'pivots_right': _pivots_right,
+        'comparisons': _comparisons,
+        'descents': _descents,
+        'allocations': _allocations,
+    }
+
+
+def reset_counters():
+    "Reset counts to zero."
+    global _splits, _pivots_left, _pivots_right, _comparisons, _descents
+    global _allocations
+    _splits = 0
+    _pivots_left = 0
+    _pivots_right = 0
+    _comparisons = 0
+    _descents = 0
+    _allocations = 0
+
+
+# Bisect functions check COUNTERS once per call rather than once per step.
 
 
 def bisect_left(values, value):
+    global _comparisons
     lo: cython.int = 0
     hi: cython.int = len(values)
+    mid: cython.int
+    if COUNTERS:
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            _comparisons += 1
+            if values[mid] < value:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
     while lo < hi:
-        mid: cython.int = (lo + hi) >> 1
+        mid = (lo + hi) >> 1
         if values[mid] < value:
             lo = mid + 1
         else:
@@ -38,134 +93,1670 @@ def bisect_left(values, value):
     return lo
 
 
-class Prique:
-    def init(self):
-        leaf = Leaf()
-        leaf._parent = None
-        leaf._total = 0
-        leaf._max = None
-        leaf._left = None
-        leaf._right = None
-        leaf._keys = []
-        leaf._values = []
-        self._tree = leaf
+def bisect_right(values, value):
+    global _comparisons
+    lo: cython.int = 0
+    hi: cython.int = len(values)
+    mid: cython.int
+    if COUNTERS:
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            _comparisons += 1
+            if value < values[mid]:
+                hi = mid
+            else:
+                lo = mid + 1
+        return lo
+    while lo < hi:
+        mid = (lo + hi) >> 1
+        if value < values[mid]:
+            hi = mid
+        else:
+            lo = mid + 1
+    return lo
+
+
+class Prique:
+    def init(self, items=(), load=MAX_LEAF_SIZE, handles=False, indexed=False,
+             maxlen=0, key=None):
+        """Initialize prique with (key, value) pairs from items.
+
+        The `load` sets the maximum leaf size. When `handles` is set, add_left
+        returns a handle for use with change and remove. When `indexed` is
+        set, a dict maps each value to its leaf so discard, contains, index
+        and count avoid scanning equal keys. Values must then be hashable
+        and unique. The dict costs about 40 to 100 bytes per item on 64-bit
+        CPython, depending on how full its table is.
+
+        When `maxlen` is greater than zero, only the `maxlen` items with the
+        smallest keys are retained. Inserts into a full prique with keys
+        greater than the largest key are rejected after a single comparison
+        and other inserts evict the item at the right end.
+
+        When `key` is set, it is a function from value to key and items are
+        values. The key of each value is computed once, on insert, and
+        stored so descents, bisects and rebalancing never call it. Use
+        push_left, push_right and discard_value to work with values alone.
+
+        Items with equal keys are in reverse order, as for update.
+
+        """
+        if key is not None:
+            items = [(key(value), value) for value in items]
+
+        pairs = list(items)
+        pairs.reverse()
+        pairs.sort(key=itemgetter(0))
+
+        if maxlen > 0:
+            del pairs[maxlen:]
+
+        keys = [pair[0] for pair in pairs]
+        values = [pair[1] for pair in pairs]
+        self.init_sorted(keys, values, load, handles, indexed, maxlen, key)
+
+    def init_sorted(self, keys, values, load=MAX_LEAF_SIZE, handles=False,
+                    indexed=False, maxlen=0, key=None):
+        """Initialize prique from lists of keys and values in sorted order.
+
+        Options are as for init. The keys are not compared, so they must
+        already be sorted, and the leafs are built directly from slices of
+        the lists. Used to restore a prique from the output of dump.
+
+        """
+        if load < 4:
+            raise ValueError('load must be at least 4')
+
+        if maxlen < 0:
+            raise ValueError('maxlen must not be negative')
+
+        if len(keys) != len(values):
+            raise ValueError('keys and values must have equal length')
+
+        min_leaf_size: cython.int = load >> 2
+        self._max_leaf_size = load
+        self._max_leaf_size_sub1 = load - 1
+        self._max_leaf_size_div2 = load >> 1
+        self._max_leaf_size_mul2 = load << 1
+        self._min_leaf_size = min_leaf_size
+        self._avg_leaf_size = min_leaf_size + ((load - min_leaf_size) >> 1)
+
+        self._maxlen = maxlen
+        self._key = key
+        self._free_leafs = []
+        self._free_branches = []
+
+        if maxlen and len(keys) > maxlen:
+            keys = keys[:maxlen]
+            values = values[:maxlen]
+
+        self._lookup = None
+
+        if indexed:
+            if len(set(values)) != len(values):
+                raise ValueError('values must be unique')
+
+            self._lookup = {}
+
+        self._load(keys, values, [None] * len(keys) if handles else None)
+
+    def dump(self):
+        """Return pair of lists of keys and values in sorted order.
+
+        The lists are concatenated from the leafs without creating a pair
+        per item. Pass them to init_sorted to rebuild the prique.
+
+        """
+        keys = []
+        values = []
+        leaf = self._head
+
+        while leaf is not None:
+            keys.extend(leaf._keys)
+            values.extend(leaf._values)
+            leaf = cython.cast(Leaf, leaf._right)
+
+        return keys, values
+
+    def _load(self, keys, values, handles):
+        """Build tree bottom-up from sorted keys and values.
+
+        Keys and values are cut into evenly sized leafs of about
+        `_avg_leaf_size` items which are linked together and then joined by
+        balanced branches in a single linear pass.
+
+        """
+        total: cython.int = len(keys)
+        avg_leaf_size: cython.int = self._avg_leaf_size
+        count: cython.int = (total + avg_leaf_size - 1) // avg_leaf_size
+        index: cython.int
+        start: cython.int = 0
+        stop: cython.int
+
+        if count == 0:
+            count = 1
+
+        size: cython.int = total // count
+        extra: cython.int = total % count
+        leafs = []
+        prev = None
+
+        for index in range(count):
+            stop = start + size + (index < extra)
+            leaf = Leaf()
+            leaf._parent = None
+            leaf._total = stop - start
+            leaf._keys = keys[start:stop]
+            leaf._values = values[start:stop]
+            leaf._max = keys[stop - 1] if stop else None
+            leaf._left = prev
+            leaf._right = None
+
+            if handles is None:
+                leaf._handles = None
+            else:
+                leaf._handles = handles[start:stop]
+
+            self._relocate(leaf, 0, stop - start)
+
+            if prev is not None:
+                cython.cast(Leaf, prev)._right = leaf
+
+            leafs.append(leaf)
+            prev = leaf
+            start = stop
+
+        self._tree = self._build(leafs, 0, count)
+        self._head = leafs[0]
+        self._tail = leafs[-1]
+
+    def _build(self, leafs, start, stop):
+        # Recursively join leafs between start and stop by branches.
+
+        if stop - start == 1:
+            return cython.cast(Branch, leafs[start])
+
+        middle: cython.int = (start + stop) >> 1
+        branch_left = self._build(leafs, start, middle)
+        branch_right = self._build(leafs, middle, stop)
+        branch = self._new_branch()
+        branch._parent = None
+        branch._total = branch_left._total + branch_right._total
+        branch._max = branch_right._max
+        branch._left = branch_left
+        branch._right = branch_right
+        branch_left._parent = branch
+        branch_right._parent = branch
+        return branch
+
+    def add_left(self, key, value):
+        """Add key and value before items with equal keys.
+
+        Return handle when handles are enabled, else None. When full, keys
+        greater than the largest key are rejected and None is returned.
+
+        """
+        return self._add(key, value, False)
+
+    def add_right(self, key, value):
+        """Add key and value after items with equal keys.
+
+        Items with equal keys are then removed from the left end in the
+        order they were added, without a sequence counter in the key. When
+        full, keys greater than or equal to the largest key are rejected.
+
+        """
+        return self._add(key, value, True)
+
+    def push_left(self, value):
+        "Add value with key from key function as by add_left."
+        return self._add(self._key(value), value, False)
+
+    def push_right(self, value):
+        "Add value with key from key function as by add_right."
+        return self._add(self._key(value), value, True)
+
+    def _add(self, key, value, right):
+        global _splits, _comparisons, _descents
+
+        # Reject key beyond the largest key when full.
+
+        maxlen: cython.int = self._maxlen
+        branch = self._tree
+
+        if maxlen and branch._total >= maxlen:
+            if branch._max < key or (right and not key < branch._max):
+                return None
+
+        # Insert in tail when key is beyond the leaf before it, as for
+        # ascending keys, else traverse to leaf for insert. When right is
+        # set, traverse past leafs with max equal to key.
+
+        leaf = self._tail
+        leaf_left = leaf._left
+
+        if COUNTERS:
+            _comparisons += 1
+
+        if leaf_left is not None:
+            if right:
+                if key < leaf_left._max:
+                    if COUNTERS:
+                        _descents += 1
+
+                    while type(branch) is not Leaf:
+                        if COUNTERS:
+                            _comparisons += 1
+                        if branch._left._max <= key:
+                            branch = branch._right
+                        else:
+                            branch = branch._left
+
+                    leaf = cython.cast(Leaf, branch)
+            elif not leaf_left._max < key:
+                if COUNTERS:
+                    _descents += 1
+
+                while type(branch) is not Leaf:
+                    if COUNTERS:
+                        _comparisons += 1
+                    if branch._left._max < key:
+                        branch = branch._right
+                    else:
+                        branch = branch._left
+
+                leaf = cython.cast(Leaf, branch)
+
+        # Create handle when leafs track handles.
+
+        handles = leaf._handles
+        handle = None
+
+        if handles is not None:
+            handle = Handle()
+            handle._leaf = leaf
+
+        # Index value when lookup is enabled.
+
+        lookup = self._lookup
+
+        if lookup is not None:
+            if value in lookup:
+                raise ValueError('value already in prique')
+            lookup[value] = leaf
+
+        # Insert key and value in leaf.
+
+        max_leaf_size_sub1: cython.int = self._max_leaf_size_sub1
+
+        index: cython.int
+
+        if leaf._total < max_leaf_size_sub1:
+            leaf_keys = leaf._keys
+
+            if right:
+                index = bisect_right(leaf_keys, key)
+            else:
+                index = bisect_left(leaf_keys, key)
+
+            leaf_keys.insert(index, key)
+            leaf._values.insert(index, value)
+
+            if handles is not None:
+                handles.insert(index, handle)
+
+            leaf_total: cython.int = leaf._total
+            new_max: cython.int = (index == leaf_total)
+            leaf._total = leaf_total + 1
+            branch = leaf._parent
+
+            if new_max:
+                leaf._max = key
+                if branch is not None and branch._right is leaf:
+                    branch._max = key
+        else:
+            if COUNTERS:
+                _splits += 1
+
+            leaf_parent = leaf._parent
+            old_leaf_left = cython.cast(Leaf, leaf._left)
+            old_leaf_right = cython.cast(Leaf, leaf._right)
+            keys = leaf._keys
+            values = leaf._values
+
+            if right:
+                index = bisect_right(keys, key)
+            else:
+                index = bisect_left(keys, key)
+
+            keys.insert(index, key)
+            values.insert(index, value)
+            new_max = (index == max_leaf_size_sub1)
+
+            # Split in half, or keep the tail full when appending to it so
+            # ascending keys fill leafs.
+
+            div2: cython.int
+
+            if new_max and old_leaf_right is None:
+                div2 = max_leaf_size_sub1
+            else:
+                div2 = self._max_leaf_size_div2
+
+            branch = self._new_branch()
+            leaf_right = self._new_leaf(handles is not None)
+            keys_right = leaf_right._keys
+            keys_right.extend(keys[div2:])
+            leaf_right._values.extend(values[div2:])
+            del keys[div2:]
+            del values[div2:]
+
+            leaf_left = leaf
+            leaf_left._parent = branch
+            leaf_left._total = div2
+            leaf_left._max = keys[-1]
+
+            leaf_right._parent = branch
+            leaf_right._total = max_leaf_size_sub1 + 1 - div2
+            leaf_right._max = keys_right[-1]
+
+            if handles is not None:
+                handles.insert(index, handle)
+                leaf_right._handles.extend(handles[div2:])
+                del handles[div2:]
+
+            self._relocate(leaf_right, 0, leaf_right._total)
+
+            leaf_left._left = old_leaf_left
+            leaf_left._right = leaf_right
+            leaf_right._left = leaf_left
+            leaf_right._right = old_leaf_right
+
+            branch._parent = leaf_parent
+            branch._total = max_leaf_size_sub1
+            branch._max = keys_right[-1]
+            branch._left = leaf_left
+            branch._right = leaf_right
+
+            if leaf_parent is None:
+                self._tree = branch
+            else:
+                if leaf_parent._left is leaf:
+                    leaf_parent._left = branch
+                else:
+                    leaf_parent._right = branch
+
+            if old_leaf_right is not None:
+                old_leaf_right._left = leaf_right
+            else:
+                self._tail = leaf_right
+
+        # Traverse branch to root and update max if necessary.
+
+        if new_max:
+            max_branch = branch
+            while max_branch is not None:
+                max_branch_parent = max_branch._parent
+                if max_branch_parent is None:
+                    break
+                max_branch_is_right: cython.int
+                max_branch_is_right = max_branch_parent._right is max_branch
+                if max_branch_is_right:
+                    max_branch_parent._max = key
+                else:
+                    # I have not found how to cover this branch.
+                    # Maybe it's not possible?
+                    break  # pragma: no cover
+                max_branch = max_branch_parent
+
+        # Traverse branch to root, increment total, and pivot as necessary.
+
+        max_leaf_size_mul2: cython.int = self._max_leaf_size_mul2
+
+        while branch is not None:
+            branch._total += 1
+            branch_parent = branch._parent
+
+            #   A
+            #  / \
+            # B   C
+
+            branch_a_total = branch._total
+            branch_b_total: cython.int
+            branch_b_total = branch._left._total
+            branch_c_total: cython.int
+            branch_c_total = branch._right._total
+
+            if branch_a_total < max_leaf_size_mul2:
+                pass
+            elif branch_b_total > (branch_c_total << 1):
+                self._pivot_right(branch)
+            elif branch_c_total > (branch_b_total << 1):
+                self._pivot_left(branch)
+
+            branch = branch_parent
+
+        # Evict item at right end when over maxlen.
+
+        if maxlen and self._tree._total > maxlen:
+            leaf = self._tail
+            self._remove(leaf, leaf._total - 1)
+
+        return handle
+
+    def _relocate(self, leaf, start, stop):
+        # Point handles and lookup of items from start to stop at leaf.
+
+        index: cython.int
+        handles = leaf._handles
+
+        if handles is not None:
+            for index in range(start, stop):
+                handle = handles[index]
+                if handle is not None:
+                    cython.cast(Handle, handle)._leaf = leaf
+
+        lookup = self._lookup
+
+        if lookup is not None:
+            values = leaf._values
+            for index in range(start, stop):
+                lookup[values[index]] = leaf
+
+    def update(self, items):
+        """Add (key, value) pairs from items to prique.
+
+        Items are placed as by add_left in turn: before items with equal
+        keys, so items with equal keys within items are in reverse order.
+
+        """
+        global _comparisons, _descents
+        key = self._key
+
+        if key is not None:
+            items = [(key(value), value) for value in items]
+
+        # Sort reversed pairs so the stable sort reverses equal keys.
+
+        pairs = list(items)
+        pairs.reverse()
+        pairs.sort(key=itemgetter(0))
+        maxlen: cython.int = self._maxlen
+
+        if maxlen:
+            del pairs[maxlen:]
+
+        size: cython.int = len(pairs)
+        total: cython.int = self._tree._total
+
+        if size == 0:
+            return
+
+        lookup = self._lookup
+
+        if lookup is not None:
+            values = [pair[1] for pair in pairs]
+            if (len(set(values)) != size
+                    or not lookup.keys().isdisjoint(values)):
+                raise ValueError('value already in prique')
+
+        if size > (total >> 3):
+            # Large batch: merge with existing items and rebuild.
+
+            leaf = self._head
+            handles = leaf._handles
+
+            if handles is None:
+                while leaf is not None:
+                    pairs.extend(zip(leaf._keys, leaf._values))
+                    leaf = cython.cast(Leaf, leaf._right)
+            else:
+                pairs = [(key, value, None) for key, value in pairs]
+
+                while leaf is not None:
+                    pairs.extend(zip(leaf._keys, leaf._values, leaf._handles))
+                    leaf = cython.cast(Leaf, leaf._right)
+
+            pairs.sort(key=itemgetter(0))
+
+            if maxlen and len(pairs) > maxlen:
+                # Drop items beyond maxlen.
+
+                for pair in pairs[maxlen:]:
+                    if lookup is not None:
+                        lookup.pop(pair[1], None)
+                    if handles is not None and pair[2] is not None:
+                        cython.cast(Handle, pair[2])._leaf = None
+
+                del pairs[maxlen:]
+
+            keys = [pair[0] for pair in pairs]
+            values = [pair[1] for pair in pairs]
+
+            if handles is not None:
+                handles = [pair[2] for pair in pairs]
+
+            self._load(keys, values, handles)
+            return
+
+        # Small batch: splice runs of pairs into leafs from left to right.
+
+        index: cython.int = 0
+        stop: cython.int
+        branch: Branch
+        leaf = None
+
+        while index < size:
+            key = pairs[index][0]
+
+            # Continue with the next leaf when possible, else traverse. Keys
+            # of earlier runs are less than key, so climb from the last leaf
+            # to the lowest branch with a max not less than key and descend
+            # from there rather than from the root.
+
+            if leaf is not None:
+                leaf = cython.cast(Leaf, leaf._right)
+
+            if leaf is None or (leaf._right is not None and leaf._max < key):
+                if leaf is None:
+                    branch = self._tree
+                else:
+                    branch = leaf
+
+                    while branch._max < key and branch._parent is not None:
+                        branch = branch._parent
+
+                if COUNTERS:
+                    _descents += 1
+
+                while type(branch) is not Leaf:
+                    if COUNTERS:
+                        _comparisons += 1
+                    if branch._left._max < key:
+                        branch = branch._right
+                    else:
+                        branch = branch._left
+
+                leaf = cython.cast(Leaf, branch)
+
+            # Find run of pairs that belong in leaf.
+
+            stop = index + 1
+
+            if leaf._right is None:
+                stop = size
+            else:
+                leaf_max = leaf._max
+
+                while stop < size and pairs[stop][0] <= leaf_max:
+                    stop += 1
+
+            leaf = self._splice(leaf, pairs, index, stop)
+            index = stop
+
+        # Evict items at right end when over maxlen.
+
+        if maxlen:
+            while self._tree._total > maxlen:
+                leaf = self._tail
+                self._remove(leaf, leaf._total - 1)
+
+    def _splice(self, leaf, pairs, start, stop):
+        """Merge pairs from start to stop into leaf.
+
+        Pairs that fit are inserted in place. Overflowing leafs are cut into
+        evenly sized leafs joined by a balanced subtree in place of the leaf.
+        Totals and pivots are updated once for the whole run. Returns the
+        right-most leaf that was modified.
+
+        """
+        global _splits
+        leaf_keys = leaf._keys
+        leaf_values = leaf._values
+        leaf_handles = leaf._handles
+        pos: cython.int
+        index: cython.int
+
+        if leaf._total + (stop - start) < self._max_leaf_size:
+            # Insert from right to left so each pair lands before pairs and
+            # items with equal keys.
+
+            old_max = leaf._max
+            lookup = self._lookup
+
+            for index in range(stop - 1, start - 1, -1):
+                key, value = pairs[index]
+                pos = bisect_left(leaf_keys, key)
+                leaf_keys.insert(pos, key)
+                leaf_values.insert(pos, value)
+
+                if leaf_handles is not None:
+                    leaf_handles.insert(pos, None)
+
+                if lookup is not None:
+                    lookup[value] = leaf
+
+            leaf._total += stop - start
+            leaf._max = leaf_keys[-1]
+
+            if leaf._max is not old_max:
+                self._propagate_max(leaf)
+
+            self._update_total(leaf._parent, stop - start)
+            return leaf
+
+        keys = []
+        values = []
+        handles = None if leaf_handles is None else []
+        last: cython.int = 0
+
+        for index in range(start, stop):
+            key, value = pairs[index]
+            pos = bisect_left(leaf_keys, key)
+            keys.extend(leaf_keys[last:pos])
+            values.extend(leaf_values[last:pos])
+            keys.append(key)
+            values.append(value)
+
+            if handles is not None:
+                handles.extend(leaf_handles[last:pos])
+                handles.append(None)
+
+            last = pos
+
+        keys.extend(leaf_keys[last:])
+        values.extend(leaf_values[last:])
+
+        if handles is not None:
+            handles.extend(leaf_handles[last:])
+
+        total: cython.int = len(keys)
+        parent = leaf._parent
+        new_max: cython.int = leaf._max is not keys[-1]
+
+        # Cut keys and values into leafs after leaf.
+
+        avg_leaf_size: cython.int = self._avg_leaf_size
+        count: cython.int = (total + avg_leaf_size - 1) // avg_leaf_size
+
+        if COUNTERS:
+            _splits += count - 1
+        old_leaf_right = cython.cast(Leaf, leaf._right)
+        size: cython.int = total // count
+        extra: cython.int = total % count
+        leafs = []
+        prev = leaf
+        begin: cython.int = 0
+        end: cython.int
+
+        for index in range(count):
+            end = begin + size + (index < extra)
+
+            if index == 0:
+                node = leaf
+            else:
+                node = self._new_leaf(handles is not None)
+                node._left = prev
+                cython.cast(Leaf, prev)._right = node
+
+            node._total = end - begin
+            node._keys = keys[begin:end]
+            node._values = values[begin:end]
+            node._max = keys[end - 1]
+
+            if handles is None:
+                node._handles = None
+            else:
+                node._handles = handles[begin:end]
+
+            self._relocate(node, 0, end - begin)
+            leafs.append(node)
+            prev = node
+            begin = end
+
+        node._right = old_leaf_right
+
+        if old_leaf_right is None:
+            self._tail = node
+        else:
+            old_leaf_right._left = node
+
+        # Replace leaf with subtree of leafs when the subtree is the whole
+        # tree or a plain split of the leaf.
+
+        branch = self._build(leafs, 0, count)
+        branch._parent = None
+
+        if parent is None:
+            self._tree = branch
+            return node
+
+        if count == 2:
+            branch._parent = parent
+
+            if parent._left is leaf:
+                parent._left = branch
+            else:
+                parent._right = branch
+
+            if new_max:
+                self._propagate_max(branch)
+
+            self._update_total(parent, stop - start)
+            return node
+
+        # Else cut the tree along the path from leaf to root and join the
+        # subtrees on each side to the subtree of leafs, as by _cut, so a
+        # large run does not outweigh its siblings.
+
+        child = leaf
+        self._tree = branch
+
+        while parent is not None:
+            grandparent = parent._parent
+
+            if parent._right is child:
+                sibling = parent._left
+                sibling._parent = None
+                self._join(sibling, self._tree)
+            else:
+                sibling = parent._right
+                sibling._parent = None
+                self._join(self._tree, sibling)
+
+            self._retire(parent)
+            child = parent
+            parent = grandparent
+
+        return node
+
+    def split(self, key):
+        """Split prique at key.
+
+        Items with keys less than key remain and a new prique of items with
+        keys greater than or equal to key is returned. The tree is cut along
+        the path to key and the pieces are joined again, so the cost is
+        logarithmic. When indexed, the lookup costs linear time in the
+        smaller of the two priques.
+
+        """
+        lookup = self._lookup
+        other: Prique = self._cut(self.bisect_left(key))
+
+        if lookup is not None:
+            if other._tree._total <= self._tree._total:
+                self._partition(lookup, other)
+            else:
+                other._lookup = lookup
+                self._lookup = {}
+                other._partition(lookup, self)
+
+        return other
+
+    def _cut(self, index):
+        """Cut prique at index and return new prique of items from index.
+
+        The new prique has the same options but its lookup is left empty for
+        the caller to fill.
+
+        """
+        leaf: Leaf
+        node: Branch
+        pos: cython.int
+        handles = self._head._handles is not None
+        other: Prique = Prique()
+        other.init(
+            load=self._max_leaf_size,
+            handles=handles,
+            indexed=self._lookup is not None,
+            maxlen=self._maxlen,
+            key=self._key,
+        )
+        total: cython.int = self._tree._total
+
+        if index >= total:
+            return other
+
+        if index <= 0:
+            # Move all items to other.
+
+            other._tree = self._tree
+            other._head = self._head
+            other._tail = self._tail
+            self._load([], [], [] if handles else None)
+            return other
+
+        leaf, pos = self._locate(index)
+        total = leaf._total
+
+        # Cut leaf at pos and link leafs on each side of the cut.
+
+        old_tail = self._tail
+        lefts = []
+        rights = []
+
+        if pos:
+            old_leaf_right = cython.cast(Leaf, leaf._right)
+            leaf_right = self._new_leaf(handles)
+            leaf_right._parent = None
+            leaf_right._total = total - pos
+            leaf_right._max = leaf._max
+            leaf_right._keys.extend(leaf._keys[pos:])
+            leaf_right._values.extend(leaf._values[pos:])
+            leaf_right._left = None
+            leaf_right._right = old_leaf_right
+
+            if handles:
+                leaf_right._handles.extend(leaf._handles[pos:])
+                del leaf._handles[pos:]
+
+            self._relocate(leaf_right, 0, total - pos)
+
+            if old_leaf_right is not None:
+                old_leaf_right._left = leaf_right
+
+            del leaf._keys[pos:]
+            del leaf._values[pos:]
+            leaf._total = pos
+            leaf._max = leaf._keys[-1]
+            leaf._right = None
+            self._tail = leaf
+            other._head = leaf_right
+            other._tail = leaf_right if old_tail is leaf else old_tail
+            lefts.append(leaf)
+            rights.append(leaf_right)
+        else:
+            leaf_left = cython.cast(Leaf, leaf._left)
+            leaf_left._right = None
+            leaf._left = None
+            self._tail = leaf_left
+            other._head = leaf
+            other._tail = old_tail
+            rights.append(leaf)
+
+        # Collect subtrees on each side of the path from leaf to root.
+
+        node = leaf
+        parent = node._parent
+
+        while parent is not None:
+            if parent._right is node:
+                lefts.append(parent._left)
+            else:
+                rights.append(parent._right)
+            node = parent
+            parent = node._parent
+
+        # Join subtrees from the cut outward.
+
+        self._tree = None
+        other._tree = None
+
+        for node in lefts:
+            node._parent = None
+            if self._tree is None:
+                self._tree = node
+            else:
+                self._join(node, self._tree)
+
+        for node in rights:
+            node._parent = None
+            if other._tree is None:
+                other._tree = node
+            else:
+                other._join(other._tree, node)
+
+        # Rebalance leafs at the cut. Lookup entries of both priques are
+        # still in the lookup of prique until the caller partitions them.
+
+        self._rebalance(self._tail)
+        other_lookup = other._lookup
+        other._lookup = self._lookup
+        other._rebalance(other._head)
+        other._lookup = other_lookup
+        return other
+
+    def _partition(self, lookup, other):
+        # Move lookup entries for values in other to other's lookup.
+
+        other_lookup = other._lookup
+        leaf = other._head
+
+        while leaf is not None:
+            for value in leaf._values:
+                other_lookup[value] = lookup.pop(value)
+            leaf = cython.cast(Leaf, leaf._right)
+
+    def join(self, other):
+        """Join items from other prique into prique.
+
+        The keys of other must all be greater than or equal to the keys of
+        prique, or all less than or equal. The other prique must use the same
+        load, handles and indexed options and is left empty. The trees are
+        linked by a single branch so the cost is logarithmic. When indexed,
+        the lookup costs linear time in the smaller of the two priques.
+
+        """
+        if not isinstance(other, Prique):
+            raise TypeError('prique required')
+
+        if self is other:
+            raise ValueError('cannot join prique with itself')
+
+        handles = self._head._handles is not None
+        lookup = self._lookup
+        other_lookup = other._lookup
+
+        if (other._max_leaf_size != self._max_leaf_size
+                or (other._head._handles is not None) != handles
+                or (other_lookup is None) != (lookup is None)):
+            raise ValueError('prique options must match')
+
+        if other._tree._total == 0:
+            return
+
+        if self._tree._total == 0:
+            self._tree, other._tree = other._tree, self._tree
+            self._head, other._head = other._head, self._head
+            self._tail, other._tail = other._tail, self._tail
+            self._lookup, other._lookup = other_lookup, lookup
+        else:
+            left: Prique
+            right: Prique
+
+            if not other._head._keys[0] < self._tail._max:
+                left = self
+                right = other
+            elif not self._head._keys[0] < other._tail._max:
+                left = other
+                right = self
+            else:
+                raise ValueError('prique keys must not overlap')
+
+            left_tail = left._tail
+            right_head = right._head
+            self._concat(left, right)
+
+            if lookup is not None:
+                if len(other_lookup) <= len(lookup):
+                    lookup.update(other_lookup)
+                else:
+                    other_lookup.update(lookup)
+                    self._lookup = other_lookup
+
+            other._lookup = None if lookup is None else {}
+            other._load([], [], [] if handles else None)
+            self._rebalance(left_tail)
+            self._rebalance(right_head)
+
+        # Evict items at right end when over maxlen.
+
+        maxlen: cython.int = self._maxlen
+
+        if maxlen:
+            while self._tree._total > maxlen:
+                leaf = self._tail
+                self._remove(leaf, leaf._total - 1)
+
+    def _concat(self, left, right):
+        """Link leafs and join trees of left and right into prique.
+
+        Keys in left must be less than or equal to keys in right and either
+        may be prique itself. Lookups are not changed.
+
+        """
+        if right._tree._total == 0:
+            tree = left._tree
+            head = left._head
+            tail = left._tail
+        elif left._tree._total == 0:
+            tree = right._tree
+            head = right._head
+            tail = right._tail
+        else:
+            left_tail = left._tail
+            right_head = right._head
+            left_tail._right = right_head
+            right_head._left = left_tail
+            head = left._head
+            tail = right._tail
+            self._join(left._tree, right._tree)
+            tree = self._tree
+
+        self._tree = tree
+        self._head = head
+        self._tail = tail
+
+    def _join(self, left, right):
+        """Join subtrees left and right and set tree to the result.
+
+        Keys in left must be less than or equal to keys in right. The larger
+        subtree is descended along its inner edge to a node with a total
+        comparable to the smaller subtree. The node and the smaller subtree
+        are joined by a new branch and ancestors are pivoted as for insert.
+
+        """
+        left_total: cython.int = left._total
+        right_total: cython.int = right._total
+        branch = self._new_branch()
+
+        if left_total >= right_total:
+            self._tree = left
+            node = left
+
+            while type(node) is not Leaf and node._total > (right_total << 1):
+                node = node._right
+
+            parent = node._parent
+            branch._left = node
+            branch._right = right
+            branch._max = right._max
+
+            if parent is not None:
+                parent._right = branch
+        else:
+            self._tree = right
+            node = right
+
+            while type(node) is not Leaf and node._total > (left_total << 1):
+                node = node._left
+
+            parent = node._parent
+            branch._left = left
+            branch._right = node
+            branch._max = node._max
+
+            if parent is not None:
+                parent._left = branch
+
+        branch._parent = parent
+        branch._total = branch._left._total + branch._right._total
+        branch._left._parent = branch
+        branch._right._parent = branch
+
+        if parent is None:
+            self._tree = branch
+        else:
+            self._propagate_max(branch)
+            self._update_total(parent, branch._total - node._total)
+
+    def _pivot_left(self, branch):
+        """Pivot left
+
+              A
+             / \
+            B   C
+               / \
+              D   E
+
+        Pivot:
+
+              C
+             / \
+            A   E
+           / \
+          B   D
+
+        """
+        global _pivots_left
+
+        if COUNTERS:
+            _pivots_left += 1
+
+        branch_a = branch
+        branch_b = branch_a._left
+        branch_c = branch_a._right
+        branch_d = branch_c._left
+        branch_e = branch_c._right
+
+        branch_a_parent = branch_a._parent
+
+        branch_b_total: cython.int = branch_b._total
+        branch_d_total: cython.int = branch_d._total
+        branch_e_total: cython.int = branch_e._total
+
+        branch_d_max = branch_d._max
+
+        # _left, _right
+        branch_a._right = branch_d
+        branch_c._left = branch_a
+
+        # _parent
+        branch_a._parent = branch_c
+        branch_c._parent = branch_a_parent
+        branch_d._parent = branch_a
+
+        # _total
+        branch_a_total: cython.int = branch_b_total + branch_d_total
+        branch_a._total = branch_a_total
+        branch_c._total = branch_a_total + branch_e_total
+
+        # _max
+        branch_a._max = branch_d_max
+
+        if branch_a_parent is not None:
+            if branch_a_parent._left is branch_a:
+                branch_a_parent._left = branch_c
+            else:
+                branch_a_parent._right = branch_c
+
+        if self._tree is branch_a:
+            self._tree = branch_c
+
+    def _pivot_right(self, branch):
+        """Pivot right
+
+              A
+             / \
+            B   C
+           / \
+          D   E
+
+        Pivot:
+
+              B
+             / \
+            D   A
+               / \
+              E   C
+
+        """
+        global _pivots_right
+
+        if COUNTERS:
+            _pivots_right += 1
+
+        branch_a = branch
+        branch_b = branch_a._left
+        branch_c = branch_a._right
+        branch_d = branch_b._left
+        branch_e = branch_b._right
+
+        branch_a_parent = branch_a._parent
+
+        branch_c_total: cython.int = branch_c._total
+        branch_d_total: cython.int = branch_d._total
+        branch_e_total: cython.int = branch_e._total
+
+        branch_c_max = branch_c._max
+
+        # _left, _right
+        branch_a._left = branch_e
+        branch_b._right = branch_a
+
+        # _parent
+        branch_a._parent = branch_b
+        branch_b._parent = branch_a_parent
+        branch_e._parent = branch_a
+
+        # _total
+        branch_a_total: cython.int = branch_e_total + branch_c_total
+        branch_a._total = branch_a_total
+        branch_b._total = branch_d_total + branch_a_total
+
+        # _max
+        branch_b._max = branch_c_max
+
+        if branch_a_parent is not None:
+            if branch_a_parent._left is branch_a:
+                branch_a_parent._left = branch_b
+            else:
+                branch_a_parent._right = branch_b
+
+        if self._tree is branch_a:
+            self._tree = branch_b
+
+    def _find(self, key, value):
+        """Return leaf and position of item with key and value or None.
+
+        With lookup enabled the leaf is found by value in O(1). Otherwise
+        traverse to the left-most leaf that may contain key and scan items
+        with equal keys, possibly across leafs, for value.
+
+        """
+        global _comparisons, _descents
+        index: cython.int
+        lookup = self._lookup
+
+        if lookup is not None:
+            leaf = cython.cast(Leaf, lookup.get(value))
+
+            if leaf is None:
+                return None
+
+            index = leaf._values.index(value)
+
+            if key != leaf._keys[index]:
+                return None
+
+            return leaf, index
+
+        branch = self._tree
+
+        if COUNTERS:
+            _descents += 1
+
+        while type(branch) is not Leaf:
+            if COUNTERS:
+                _comparisons += 1
+            if branch._left._max < key:
+                branch = branch._right
+            else:
+                branch = branch._left
+
+        leaf = cython.cast(Leaf, branch)
+        keys = leaf._keys
+        index = bisect_left(keys, key)
+
+        while True:
+            if index == leaf._total:
+                leaf = cython.cast(Leaf, leaf._right)
+                if leaf is None:
+                    return None
+                keys = leaf._keys
+                index = 0
+
+            if key != keys[index]:
+                return None
+
+            if leaf._values[index] == value:
+                return leaf, index
+
+            index += 1
+
+    def discard(self, key, value):
+        leaf: Leaf
+        pos: cython.int
+        location = self._find(key, value)
+
+        if location is None:
+            return False
+
+        leaf, pos = location
+        self._remove(leaf, pos)
+        return True
+
+    def discard_value(self, value):
+        """Discard value with key from key function. Return True if removed.
+
+        With lookup enabled the key stored on insert is used, so the value
+        is found even if its key changed since. Otherwise the key function
+        is applied to the value.
+
+        """
+        pos: cython.int
+        lookup = self._lookup
+
+        if lookup is None:
+            return self.discard(self._key(value), value)
+
+        leaf = cython.cast(Leaf, lookup.get(value))
+
+        if leaf is None:
+            return False
+
+        pos = leaf._values.index(value)
+        self._remove(leaf, pos)
+        return True
+
+    def contains(self, key, value):
+        return self._find(key, value) is not None
+
+    def index(self, key, value):
+        leaf: Leaf
+        pos: cython.int
+        location = self._find(key, value)
+
+        if location is None:
+            raise ValueError('item not in prique')
+
+        # Traverse leaf to root and sum totals of left siblings.
+
+        leaf, pos = location
+        node = cython.cast(Branch, leaf)
+        parent = node._parent
+
+        while parent is not None:
+            if parent._right is node:
+                pos += parent._left._total
+            node = parent
+            parent = node._parent
+
+        return pos
+
+    def count(self, key, value):
+        leaf: Leaf
+        pos: cython.int
+        total: cython.int = 0
+        location = self._find(key, value)
+
+        if location is None:
+            return 0
+
+        if self._lookup is not None:
+            return 1
+
+        # Count remaining items with equal keys, possibly across leafs.
+
+        leaf, pos = location
+
+        while True:
+            if pos == leaf._total:
+                leaf = cython.cast(Leaf, leaf._right)
+                if leaf is None:
+                    return total
+                pos = 0
+
+            if key != leaf._keys[pos]:
+                return total
+
+            if leaf._values[pos] == value:
+                total += 1
+
+            pos += 1
+
+    def _remove(self, leaf, index):
+        # Remove key and value from leaf.
+
+        leaf_keys = leaf._keys
+        del leaf_keys[index]
+        value = leaf._values.pop(index)
+        handles = leaf._handles
+        lookup = self._lookup
+
+        if handles is not None:
+            handle = handles.pop(index)
+            if handle is not None:
+                cython.cast(Handle, handle)._leaf = None
+
+        if lookup is not None:
+            del lookup[value]
+
+        leaf_total: cython.int = leaf._total - 1
+        leaf._total = leaf_total
+        branch = leaf._parent
+
+        if branch is None:
+            leaf._max = leaf_keys[-1] if leaf_total else None
+            return
+
+        if leaf_total and index == leaf_total:
+            leaf._max = leaf_keys[-1]
+            self._propagate_max(leaf)
+
+        # Borrow from or merge with neighbor when leaf is too small.
+
+        if leaf_total < self._min_leaf_size:
+            branch = self._merge(leaf)
+
+        # Traverse branch to root, decrement total, and pivot as necessary.
+
+        self._update_total(branch, -1)
+
+    def _merge(self, leaf):
+        """Borrow from or merge with the neighbor of leaf.
+
+        The neighbor is the adjacent leaf in the subtree of the leaf's parent
+        so the parent's total and max are unchanged. Returns the branch from
+        which totals must still be decremented.
+
+        """
+        parent = leaf._parent
+        leaf_keys = leaf._keys
+        leaf_values = leaf._values
+        leaf_handles = leaf._handles
+        leaf_total: cython.int = leaf._total
+        min_leaf_size: cython.int = self._min_leaf_size
+        other_total: cython.int
+        count: cython.int
+        merged: cython.int
+
+        if parent._left is leaf:
+            other = cython.cast(Leaf, leaf._right)
+            other_keys = other._keys
+            other_values = other._values
+            other_handles = other._handles
+            other_total = other._total
+            merged = other_total <= min_leaf_size
+
+            if not merged:
+                # Borrow items from the front of the right neighbor.
+
+                count = (other_total - leaf_total) >> 1
+                leaf_keys.extend(other_keys[:count])
+                leaf_values.extend(other_values[:count])
+                del other_keys[:count]
+                del other_values[:count]
+
+                if leaf_handles is not None:
+                    leaf_handles.extend(other_handles[:count])
+                    del other_handles[:count]
+
+                self._relocate(leaf, leaf_total, leaf_total + count)
+
+                leaf._total = leaf_total + count
+                leaf._max = leaf_keys[-1]
+                other._total = other_total - count
+            else:
+                # Merge items into the front of the right neighbor.
+
+                other_keys[:0] = leaf_keys
+                other_values[:0] = leaf_values
+
+                if leaf_handles is not None:
+                    other_handles[:0] = leaf_handles
+
+                self._relocate(other, 0, leaf_total)
+
+                other._total = other_total + leaf_total
+        else:
+            other = cython.cast(Leaf, leaf._left)
+            other_keys = other._keys
+            other_values = other._values
+            other_handles = other._handles
+            other_total = other._total
+            merged = other_total <= min_leaf_size
+
+            if not merged:
+                # Borrow items from the back of the left neighbor.
+
+                count = (other_total - leaf_total) >> 1
+                leaf_keys[:0] = other_keys[-count:]
+                leaf_values[:0] = other_values[-count:]
+                del other_keys[-count:]
+                del other_values[-count:]
+
+                if leaf_handles is not None:
+                    leaf_handles[:0] = other_handles[-count:]
+                    del other_handles[-count:]
+
+                self._relocate(leaf, 0, count)
+
+                leaf._total = leaf_total + count
+                other._total = other_total - count
+                other._max = other_keys[-1]
+                self._propagate_max(other)
+
+                if not leaf_total:
+                    leaf._max = leaf_keys[-1]
+                    self._propagate_max(leaf)
+            else:
+                # Merge items into the back of the left neighbor.
+
+                other_keys.extend(leaf_keys)
+                other_values.extend(leaf_values)
+
+                if leaf_handles is not None:
+                    other_handles.extend(leaf_handles)
+
+                self._relocate(other, other_total, other_total + leaf_total)
+
+                other._total = other_total + leaf_total
+                other._max = other_keys[-1]
+                self._propagate_max(other)
+
+        # Update totals between the neighbor and the parent.
+
+        delta: cython.int = leaf_total if merged else -count
+        branch = other._parent
+
+        while branch is not parent:
+            branch._total += delta
+            branch = branch._parent
+
+        if not merged:
+            return parent
+
+        branch = parent._parent
+        self._unlink(leaf)
+        return branch
+
+    def _rebalance(self, leaf):
+        """Borrow or merge until leaf is not below the minimum leaf size.
+
+        Used for leafs at the seams of cut and concat. When leaf is merged
+        into its neighbor, the neighbor is rebalanced in turn. Leafs that
+        were already merged away, or are the only leaf, are left alone.
+
+        """
+        min_leaf_size: cython.int = self._min_leaf_size
+
+        while leaf._total < min_leaf_size and leaf._parent is not None:
+            if leaf._parent._left is leaf:
+                other = cython.cast(Leaf, leaf._right)
+            else:
+                other = cython.cast(Leaf, leaf._left)
+
+            branch = self._merge(leaf)
+            self._update_total(branch, 0)
+
+            if leaf._parent is None:
+                leaf = other
+
+    def _unlink(self, leaf):
+        # Remove leaf from linked list of leafs.
+
+        leaf_left = cython.cast(Leaf, leaf._left)
+        leaf_right = cython.cast(Leaf, leaf._right)
+
+        if leaf_left is not None:
+            leaf_left._right = leaf_right
+        else:
+            self._head = leaf_right
+
+        if leaf_right is not None:
+            leaf_right._left = leaf_left
+        else:
+            self._tail = leaf_left
+
+        # Replace parent of leaf with sibling of leaf.
+
+        parent = leaf._parent
+
+        if parent._left is leaf:
+            sibling = parent._right
+        else:
+            sibling = parent._left
+
+        grandparent = parent._parent
+        sibling._parent = grandparent
+
+        if grandparent is None:
+            self._tree = sibling
+        elif grandparent._left is parent:
+            grandparent._left = sibling
+        else:
+            grandparent._right = sibling
+
+        self._propagate_max(sibling)
+        self._retire(leaf)
+        self._retire(parent)
+
+    def _new_branch(self):
+        # Return branch from pool or allocate branch.
 
-    def add_left(self, key, value):
-        # Traverse to leaf for insert.
+        global _allocations
+        free = self._free_branches
 
-        branch = self._tree
+        if free:
+            return cython.cast(Branch, free.pop())
 
-        while type(branch) is not Leaf:
-            if cython.cast(Branch, branch._left)._max < key:
-                branch = cython.cast(Branch, branch._right)
-            else:
-                branch = cython.cast(Branch, branch._left)
+        if COUNTERS:
+            _allocations += 1
 
-        leaf = cython.cast(Leaf, branch)
+        return Branch()
 
-        # Insert key and value in leaf.
+    def _new_leaf(self, handles):
+        # Return leaf with empty lists from pool or allocate leaf.
 
-        if leaf._total < MAX_LEAF_SIZE_SUB1:
-            leaf_keys = leaf._keys
-            index = bisect_left(leaf_keys, key)
-            leaf_keys.insert(index, key)
-            leaf._values.insert(index, value)
-            leaf_total: cython.int = leaf._total
-            new_max: cython.int = (index == leaf_total)
-            leaf._total = leaf_total + 1
-            branch = leaf._parent
+        global _allocations
+        free = self._free_leafs
 
-            if new_max:
-                leaf._max = key
-                if branch is not None and branch._right is leaf:
-                    branch._max = key
-        else:
-            leaf_parent = leaf._parent
-            old_leaf_left = cython.cast(Leaf, leaf._left)
-            old_leaf_right = cython.cast(Leaf, leaf._right)
-            keys = leaf._keys
-            values = leaf._values
-            index = bisect_left(keys, key)
-            keys.insert(index, key)
-            values.insert(index, value)
-            new_max = (index == MAX_LEAF_SIZE_SUB1)
-            keys_left = keys[:MAX_LEAF_SIZE_DIV2]
-            keys_right = keys[MAX_LEAF_SIZE_DIV2:]
-            values_left = values[:MAX_LEAF_SIZE_DIV2]
-            values_right = values[MAX_LEAF_SIZE_DIV2:]
-            branch = Branch()
+        if free:
+            return cython.cast(Leaf, free.pop())
 
-            leaf_left = leaf
-            leaf_left._parent = branch
-            leaf_left._total = MAX_LEAF_SIZE_DIV2
-            leaf_left._max = keys_left[-1]
-            leaf_left._keys = keys_left
-            leaf_left._values = values_left
+        if COUNTERS:
+            _allocations += 1
 
-            leaf_right = Leaf()
-            leaf_right._parent = branch
-            leaf_right._total = MAX_LEAF_SIZE_DIV2
-            leaf_right._max = keys_right[-1]
-            leaf_right._keys = keys_right
-            leaf_right._values = values_right
+        leaf = Leaf()
+        leaf._keys = []
+        leaf._values = []
+        leaf._handles = [] if handles else None
+        return leaf
 
-            leaf_left._left = old_leaf_left
-            leaf_left._right = leaf_right
-            leaf_right._left = leaf_left
-            leaf_right._right = old_leaf_right
+    def _retire(self, node):
+        # Clear unlinked node and keep it for reuse when the pool has room.
 
-            branch._parent = leaf_parent
-            branch._total = MAX_LEAF_SIZE_SUB1
-            branch._max = keys_right[-1]
-            branch._left = leaf_left
-            branch._right = leaf_right
+        node._parent = None
+        node._total = 0
+        node._max = None
+        node._left = None
+        node._right = None
 
-            if leaf_parent is None:
-                self._tree = branch
-            else:
-                if leaf_parent._left is leaf:
-                    leaf_parent._left = branch
-                else:
-                    leaf_parent._right = branch
+        if type(node) is Leaf:
+            leaf = cython.cast(Leaf, node)
+            del leaf._keys[:]
+            del leaf._values[:]
 
-            if old_leaf_right is not None:
-                old_leaf_right._left = leaf_right
+            if leaf._handles is not None:
+                del leaf._handles[:]
 
-        # Traverse branch to root and update max if necessary.
+            if len(self._free_leafs) < POOL_SIZE:
+                self._free_leafs.append(leaf)
+        elif len(self._free_branches) < POOL_SIZE:
+            self._free_branches.append(node)
 
-        if new_max:
-            max_branch = branch
-            while max_branch is not None:
-                max_branch_parent = max_branch._parent
-                if max_branch_parent is None:
-                    break
-                max_branch_is_right: cython.int
-                max_branch_is_right = max_branch_parent._right is max_branch
-                if max_branch_is_right:
-                    max_branch_parent._max = key
-                else:
-                    # I have not found how to cover this branch.
-                    # Maybe it's not possible?
-                    break  # pragma: no cover
-                max_branch = max_branch_parent
+    def _propagate_max(self, node):
+        # Traverse node to root and update max while node is right child.
 
-        # Traverse branch to root, increment total, and pivot as necessary.
+        node_max = node._max
+        parent = node._parent
+
+        while parent is not None and parent._right is node:
+            parent._max = node_max
+            node = parent
+            parent = node._parent
+
+    def _update_total(self, branch, delta):
+        # Traverse branch to root, update total, and pivot as necessary.
+
+        max_leaf_size_mul2: cython.int = self._max_leaf_size_mul2
 
         while branch is not None:
-            branch._total += 1
+            branch_total: cython.int = branch._total + delta
+            branch._total = branch_total
             branch_parent = branch._parent
 
             #   A
             #  / \
             # B   C
 
-            branch_a_total = branch._total
             branch_b_total: cython.int
-            branch_b_total = cython.cast(Branch, branch._left)._total
+            branch_b_total = branch._left._total
             branch_c_total: cython.int
-            branch_c_total = cython.cast(Branch, branch._right)._total
+            branch_c_total = branch._right._total
 
-            if branch_a_total < MAX_LEAF_SIZE_MUL2:
+            if branch_total < max_leaf_size_mul2:
                 pass
             elif branch_b_total > (branch_c_total << 1):
                 self._pivot_right(branch)
@@ -174,128 +1765,588 @@ class Prique:
 
             branch = branch_parent
 
-    def _pivot_left(self, branch):
-        """Pivot left
+    def remove(self, handle):
+        "Remove item by handle and return its key and value."
+        if not isinstance(handle, Handle):
+            raise TypeError('handle required')
 
-              A
-             / \
-            B   C
-               / \
-              D   E
+        leaf = handle._leaf
 
-        Pivot:
+        if leaf is None:
+            raise ValueError('handle not in prique')
 
-              C
-             / \
-            A   E
-           / \
-          B   D
+        pos: cython.int = leaf._handles.index(handle)
+        key = leaf._keys[pos]
+        value = leaf._values[pos]
+        self._remove(leaf, pos)
+        return key, value
+
+    def change(self, handle, key=None, right=False):
+        """Change key of item by handle. The handle remains valid.
+
+        The item is placed before items with equal keys, or after them when
+        right is set, as by add_left and add_right. When key is None, the
+        key function is applied to the value again, as after the value
+        changed.
 
         """
-        branch_a = branch
-        branch_b = cython.cast(Branch, branch_a._left)
-        branch_c = cython.cast(Branch, branch_a._right)
-        branch_d = cython.cast(Branch, branch_c._left)
-        branch_e = cython.cast(Branch, branch_c._right)
+        if not isinstance(handle, Handle):
+            raise TypeError('handle required')
 
-        branch_a_parent = branch_a._parent
+        leaf = handle._leaf
 
-        branch_b_total: cython.int = branch_b._total
-        branch_d_total: cython.int = branch_d._total
-        branch_e_total: cython.int = branch_e._total
+        if leaf is None:
+            raise ValueError('handle not in prique')
 
-        branch_d_max = branch_d._max
+        if key is None and self._key is None:
+            raise TypeError('key required without key function')
 
-        # _left, _right
-        branch_a._right = branch_d
-        branch_c._left = branch_a
+        pos: cython.int = leaf._handles.index(handle)
+        value = leaf._values[pos]
 
-        # _parent
-        branch_a._parent = branch_c
-        branch_c._parent = branch_a_parent
-        branch_d._parent = branch_a
+        if key is None:
+            key = self._key(value)
 
-        # _total
-        branch_a_total: cython.int = branch_b_total + branch_d_total
-        branch_a._total = branch_a_total
-        branch_c._total = branch_a_total + branch_e_total
+        self._remove(leaf, pos)
 
-        # _max
-        branch_a._max = branch_d_max
+        # Insert with new handle and swap in the old handle.
 
-        if branch_a_parent is not None:
-            if branch_a_parent._left is branch_a:
-                branch_a_parent._left = branch_c
-            else:
-                branch_a_parent._right = branch_c
+        new_handle = cython.cast(Handle, self._add(key, value, right))
+        leaf = new_handle._leaf
+        handles = leaf._handles
+        handles[handles.index(new_handle)] = handle
+        handle._leaf = leaf
+        return handle
 
-        if self._tree is branch_a:
-            self._tree = branch_c
+    def peekitem(self, index=-1):
+        """Return (key, value) pair at index, by default the last.
 
-    def _pivot_right(self, branch):
-        """Pivot right
+        The first and last pairs are read from the head and tail leafs in
+        constant time. Other indexes descend the tree as for getitem.
 
-              A
-             / \
-            B   C
-           / \
-          D   E
+        """
+        if self._tree._total == 0:
+            raise IndexError('peek index out of range')
 
-        Pivot:
+        if index == 0:
+            leaf = self._head
+            return leaf._keys[0], leaf._values[0]
+        elif index == -1:
+            leaf = self._tail
+            return leaf._keys[-1], leaf._values[-1]
 
-              B
-             / \
-            D   A
-               / \
-              E   C
+        return self.getitem(index)
+
+    def popitem(self, index=-1):
+        """Remove and return (key, value) pair at index, by default the last.
+
+        The first and last pairs are found at the head and tail leafs
+        without a descent, but removal still updates totals and pivots on
+        the path from the leaf to the root, so pop is O(log n) rather than
+        O(1) at either end.
 
         """
-        branch_a = branch
-        branch_b = cython.cast(Branch, branch_a._left)
-        branch_c = cython.cast(Branch, branch_a._right)
-        branch_d = cython.cast(Branch, branch_b._left)
-        branch_e = cython.cast(Branch, branch_b._right)
+        if self._tree._total == 0:
+            raise IndexError('pop index out of range')
+
+        leaf: Leaf
+        pos: cython.int
+
+        if index == 0:
+            leaf = self._head
+            pos = 0
+        elif index == -1:
+            leaf = self._tail
+            pos = leaf._total - 1
+        else:
+            leaf, pos = self._locate(index)
 
-        branch_a_parent = branch_a._parent
+        key = leaf._keys[pos]
+        value = leaf._values[pos]
+        self._remove(leaf, pos)
+        return key, value
 
-        branch_c_total: cython.int = branch_c._total
-        branch_d_total: cython.int = branch_d._total
-        branch_e_total: cython.int = branch_e._total
+    def popto(self, max_key, exc_max=False):
+        """Remove and return list of pairs with keys up to max key.
 
-        branch_c_max = branch_c._max
+        Whole leafs are detached from the left end of the leaf chain and the
+        leaf that straddles max key is trimmed once. When more than half the
+        items are removed, the remainder is rebuilt bottom-up instead.
 
-        # _left, _right
-        branch_a._left = branch_e
-        branch_b._right = branch_a
+        """
+        leaf = self._seek(max_key, not exc_max)
+        pos: cython.int
 
-        # _parent
-        branch_a._parent = branch_b
-        branch_b._parent = branch_a_parent
-        branch_e._parent = branch_a
+        if exc_max:
+            pos = bisect_left(leaf._keys, max_key)
+        else:
+            pos = bisect_right(leaf._keys, max_key)
 
-        # _total
-        branch_a_total: cython.int = branch_e_total + branch_c_total
-        branch_a._total = branch_a_total
-        branch_b._total = branch_d_total + branch_a_total
+        # Gather items from leafs before leaf and from the front of leaf.
 
-        # _max
-        branch_b._max = branch_c_max
+        keys = []
+        values = []
+        node = self._head
 
-        if branch_a_parent is not None:
-            if branch_a_parent._left is branch_a:
-                branch_a_parent._left = branch_b
+        while node is not leaf:
+            keys.extend(node._keys)
+            values.extend(node._values)
+            node = cython.cast(Leaf, node._right)
+
+        keys.extend(leaf._keys[:pos])
+        values.extend(leaf._values[:pos])
+        size: cython.int = len(keys)
+
+        if size == 0:
+            return []
+
+        total: cython.int = self._tree._total
+        handles = leaf._handles
+        lookup = self._lookup
+        index: cython.int
+
+        if lookup is not None:
+            for index in range(size):
+                del lookup[values[index]]
+
+        if handles is not None:
+            node = self._head
+
+            while node is not leaf:
+                for handle in node._handles:
+                    if handle is not None:
+                        cython.cast(Handle, handle)._leaf = None
+                node = cython.cast(Leaf, node._right)
+
+            for index in range(pos):
+                handle = handles[index]
+                if handle is not None:
+                    cython.cast(Handle, handle)._leaf = None
+
+        if size > (total >> 1):
+            # Most items removed: rebuild tree from remaining items.
+
+            rest_keys = leaf._keys[pos:]
+            rest_values = leaf._values[pos:]
+            rest_handles = None if handles is None else handles[pos:]
+            node = cython.cast(Leaf, leaf._right)
+
+            while node is not None:
+                rest_keys.extend(node._keys)
+                rest_values.extend(node._values)
+                if rest_handles is not None:
+                    rest_handles.extend(node._handles)
+                node = cython.cast(Leaf, node._right)
+
+            self._load(rest_keys, rest_values, rest_handles)
+            return list(zip(keys, values))
+
+        # Detach whole leafs from the left end.
+
+        while self._head is not leaf:
+            node = self._head
+            branch = node._parent._parent
+            node_total: cython.int = node._total
+            self._unlink(node)
+            self._update_total(branch, -node_total)
+
+        if pos == 0:
+            return list(zip(keys, values))
+
+        # Trim front of leaf.
+
+        del leaf._keys[:pos]
+        del leaf._values[:pos]
+
+        if handles is not None:
+            del handles[:pos]
+
+        leaf._total -= pos
+        branch = leaf._parent
+
+        if branch is not None:
+            if leaf._total < self._min_leaf_size:
+                branch = self._merge(leaf)
+
+            self._update_total(branch, -pos)
+
+        return list(zip(keys, values))
+
+    def delete_range(self, min_key=None, max_key=None, exc_min=False,
+                     exc_max=False):
+        """Remove items with keys between min key and max key.
+
+        Bounds are as for irange. The tree is cut at both bounds and the
+        outer pieces are joined again, so whole leafs and subtrees between
+        the bounds are dropped without visiting their items unless handles
+        or lookup must be cleared. Return the count of items removed.
+
+        """
+        leaf: Leaf
+        start: cython.int
+        stop: cython.int
+        start, stop = self._bounds(min_key, max_key, exc_min, exc_max)
+
+        if start >= stop:
+            return 0
+
+        rest: Prique = self._cut(stop)
+        middle: Prique = self._cut(start)
+        lookup = self._lookup
+        leaf = middle._head
+
+        if leaf._handles is not None or lookup is not None:
+            # Invalidate handles and drop lookup entries of removed items.
+
+            while leaf is not None:
+                if leaf._handles is not None:
+                    for handle in leaf._handles:
+                        if handle is not None:
+                            cython.cast(Handle, handle)._leaf = None
+
+                if lookup is not None:
+                    for value in leaf._values:
+                        del lookup[value]
+
+                leaf = cython.cast(Leaf, leaf._right)
+
+        left_tail = self._tail
+        right_head = rest._head
+        self._concat(self, rest)
+        self._rebalance(left_tail)
+        self._rebalance(right_head)
+        return stop - start
+
+    def getitem(self, index):
+        leaf: Leaf
+        pos: cython.int
+        leaf, pos = self._locate(index)
+        return leaf._keys[pos], leaf._values[pos]
+
+    def delitem(self, index):
+        leaf: Leaf
+        pos: cython.int
+        leaf, pos = self._locate(index)
+        self._remove(leaf, pos)
+
+    def _locate(self, index):
+        # Normalize index and traverse to leaf using totals.
+
+        global _descents
+        total: cython.int = self._tree._total
+        pos: cython.int = index
+
+        if pos < 0:
+            pos += total
+
+        if pos < 0 or pos >= total:
+            raise IndexError('index out of range')
+
+        branch = self._tree
+
+        if COUNTERS:
+            _descents += 1
+
+        while type(branch) is not Leaf:
+            branch_left = branch._left
+            left_total: cython.int = branch_left._total
+            if pos < left_total:
+                branch = branch_left
             else:
-                branch_a_parent._right = branch_b
+                pos -= left_total
+                branch = branch._right
 
-        if self._tree is branch_a:
-            self._tree = branch_b
+        return cython.cast(Leaf, branch), pos
 
-    def discard(self, key, value):
-        pass  # TODO
+    def _seek(self, key, right):
+        # Traverse to left-most leaf where key may be inserted. When right is
+        # set, traverse past leafs with max equal to key.
+
+        global _comparisons, _descents
+        branch = self._tree
+
+        if COUNTERS:
+            _descents += 1
+
+        if right:
+            while type(branch) is not Leaf:
+                if COUNTERS:
+                    _comparisons += 1
+                if branch._left._max <= key:
+                    branch = branch._right
+                else:
+                    branch = branch._left
+        else:
+            while type(branch) is not Leaf:
+                if COUNTERS:
+                    _comparisons += 1
+                if branch._left._max < key:
+                    branch = branch._right
+                else:
+                    branch = branch._left
+
+        return cython.cast(Leaf, branch)
+
+    def __iter__(self):
+        return self.islice()
+
+    def __reversed__(self):
+        return self.islice(reverse=True)
+
+    def islice(self, start=None, stop=None, reverse=False):
+        "Iterate items with index between start and stop."
+        leaf: Leaf
+        pos: cython.int
+        start, stop, _ = slice(start, stop).indices(self._tree._total)
+        count: cython.int = stop - start
+
+        if count <= 0:
+            return
+
+        if reverse:
+            leaf, pos = self._locate(stop - 1)
+
+            while True:
+                keys = leaf._keys
+                values = leaf._values
+
+                while pos >= 0:
+                    yield keys[pos], values[pos]
+                    count -= 1
+                    if count == 0:
+                        return
+                    pos -= 1
+
+                leaf = cython.cast(Leaf, leaf._left)
+                pos = leaf._total - 1
+        else:
+            leaf, pos = self._locate(start)
+
+            while True:
+                keys = leaf._keys
+                values = leaf._values
+                total: cython.int = leaf._total
+
+                while pos < total:
+                    yield keys[pos], values[pos]
+                    count -= 1
+                    if count == 0:
+                        return
+                    pos += 1
+
+                leaf = cython.cast(Leaf, leaf._right)
+                pos = 0
+
+    def irange(self, min_key=None, max_key=None, exc_min=False, exc_max=False,
+               reverse=False):
+        "Iterate items with keys between min key and max key."
+        leaf: Leaf
+        pos: cython.int
+
+        if reverse:
+            if max_key is None:
+                leaf = self._tail
+                pos = leaf._total
+            elif exc_max:
+                leaf = self._seek(max_key, False)
+                pos = bisect_left(leaf._keys, max_key)
+            else:
+                leaf = self._seek(max_key, True)
+                pos = bisect_right(leaf._keys, max_key)
+
+            while leaf is not None:
+                keys = leaf._keys
+                values = leaf._values
+                pos -= 1
+
+                while pos >= 0:
+                    key = keys[pos]
+                    if min_key is not None:
+                        if exc_min:
+                            if not min_key < key:
+                                return
+                        elif key < min_key:
+                            return
+                    yield key, values[pos]
+                    pos -= 1
+
+                leaf = cython.cast(Leaf, leaf._left)
+                if leaf is not None:
+                    pos = leaf._total
+        else:
+            if min_key is None:
+                leaf = self._head
+                pos = 0
+            elif exc_min:
+                leaf = self._seek(min_key, True)
+                pos = bisect_right(leaf._keys, min_key)
+            else:
+                leaf = self._seek(min_key, False)
+                pos = bisect_left(leaf._keys, min_key)
+
+            while leaf is not None:
+                keys = leaf._keys
+                values = leaf._values
+                total: cython.int = leaf._total
+
+                while pos < total:
+                    key = keys[pos]
+                    if max_key is not None:
+                        if exc_max:
+                            if not key < max_key:
+                                return
+                        elif max_key < key:
+                            return
+                    yield key, values[pos]
+                    pos += 1
+
+                leaf = cython.cast(Leaf, leaf._right)
+                pos = 0
+
+    def _rank(self, key, right):
+        # Traverse to leaf as in _seek and sum totals of left siblings passed.
+
+        global _comparisons, _descents
+        branch = self._tree
+        rank: cython.int = 0
+
+        if COUNTERS:
+            _descents += 1
+
+        if right:
+            while type(branch) is not Leaf:
+                if COUNTERS:
+                    _comparisons += 1
+                branch_left = branch._left
+                if branch_left._max <= key:
+                    rank += branch_left._total
+                    branch = branch._right
+                else:
+                    branch = branch_left
+
+            return rank + bisect_right(cython.cast(Leaf, branch)._keys, key)
+        else:
+            while type(branch) is not Leaf:
+                if COUNTERS:
+                    _comparisons += 1
+                branch_left = branch._left
+                if branch_left._max < key:
+                    rank += branch_left._total
+                    branch = branch._right
+                else:
+                    branch = branch_left
+
+            return rank + bisect_left(cython.cast(Leaf, branch)._keys, key)
+
+    def bisect_left(self, key):
+        "Return index of first item with key greater than or equal to key."
+        return self._rank(key, False)
+
+    def bisect_right(self, key):
+        "Return index of first item with key greater than key."
+        return self._rank(key, True)
+
+    def _bounds(self, min_key, max_key, exc_min, exc_max):
+        # Return start and stop indexes of items between min and max key.
+
+        start: cython.int = 0
+        stop: cython.int = self._tree._total
+
+        if min_key is not None:
+            start = self._rank(min_key, exc_min)
+
+        if max_key is not None:
+            stop = self._rank(max_key, not exc_max)
+
+        return start, stop
+
+    def count_range(self, min_key=None, max_key=None, exc_min=False,
+                    exc_max=False):
+        """Return count of items with keys between min key and max key.
+
+        Bounds are as for irange. Only the totals along the paths to the two
+        bounds are summed so no items are visited.
+
+        """
+        start: cython.int
+        stop: cython.int
+        start, stop = self._bounds(min_key, max_key, exc_min, exc_max)
+        return stop - start if start < stop else 0
 
     def len(self):
         return self._tree._total
 
+    def stats(self):
+        """Return mapping of statistics about the tree.
+
+        The "height" is the depth of the deepest leaf where the root has
+        depth zero and "depth_total" is the sum of depths of all leafs. The
+        "fill" maps leaf sizes to counts of leafs. The "memory" estimates
+        bytes used by branches, leafs, their lists, handles and lookup, but
+        not by keys and values.
+
+        """
+        nodes = [self._tree]
+        depths = [0]
+        node: Branch
+        leaf: Leaf
+        depth: cython.int
+        branches: cython.int = 0
+        leafs: cython.int = 0
+        depth_total: cython.long = 0
+        depth_min: cython.int = 0
+        depth_max: cython.int = 0
+        memory: cython.long = 0
+        fill = {}
+
+        while nodes:
+            node = nodes.pop()
+            depth = depths.pop()
+            memory += getsizeof(node)
+
+            if type(node) is Branch:
+                branches += 1
+                nodes.append(node._left)
+                nodes.append(node._right)
+                depths.append(depth + 1)
+                depths.append(depth + 1)
+                continue
+
+            leaf = cython.cast(Leaf, node)
+            depth_total += depth
+
+            if leafs == 0 or depth < depth_min:
+                depth_min = depth
+
+            if depth > depth_max:
+                depth_max = depth
+
+            leafs += 1
+            fill[leaf._total] = fill.get(leaf._total, 0) + 1
+            memory += getsizeof(leaf._keys) + getsizeof(leaf._values)
+            handles = leaf._handles
+
+            if handles is not None:
+                memory += getsizeof(handles)
+                for handle in handles:
+                    if handle is not None:
+                        memory += getsizeof(handle)
+
+        if self._lookup is not None:
+            memory += getsizeof(self._lookup)
+
+        return {
+            'total': self._tree._total,
+            'height': depth_max,
+            'branches': branches,
+            'leafs': leafs,
+            'fill': dict(sorted(fill.items())),
+            'depth_total': depth_total,
+            'depth_min': depth_min,
+            'depth_max': depth_max,
+            'memory': memory,
+        }
+
     def check(self):
         # Use this function to check the invariants of the prique.
         count = 0
@@ -309,6 +2360,8 @@ class Prique:
             assert _tree._max is None
             assert _tree._left is None
             assert _tree._right is None
+            assert self._head is _tree
+            assert self._tail is _tree
             return 0
 
         def _check(node):
@@ -325,6 +2378,7 @@ class Prique:
                 return node._max, node._total
 
             assert type(node) is Leaf
+            assert node._total > 0
             assert node._total == len(node._keys)
             assert node._max is node._keys[-1]
 
@@ -339,6 +2393,11 @@ class Prique:
             assert len(node._keys) == len(node._values)
             keys = node._keys
 
+            if node._handles is not None:
+                assert len(node._handles) == len(keys)
+                for handle in node._handles:
+                    assert handle is None or handle._leaf is node
+
             for index in range(1, len(keys)):
                 assert keys[index - 1] <= keys[index]
 
@@ -346,6 +2405,18 @@ class Prique:
 
         _check(_tree)
 
+        # Validate lookup of values to leafs.
+
+        lookup = self._lookup
+
+        if lookup is not None:
+            assert len(lookup) == _tree._total
+            leaf = self._head
+            while leaf is not None:
+                for value in leaf._values:
+                    assert lookup[value] is leaf
+                leaf = leaf._right
+
         # Traverse to left-most leaf and iterate all keys.
 
         left_leaf = _tree
@@ -353,6 +2424,8 @@ class Prique:
         while left_leaf._left is not None:
             left_leaf = left_leaf._left
 
+        assert left_leaf is self._head
+
         keys_inc = []
         leaf = left_leaf
 
@@ -369,6 +2442,8 @@ class Prique:
         while right_leaf._right is not None:
             right_leaf = right_leaf._right
 
+        assert right_leaf is self._tail
+
         keys_dec = []
         leaf = right_leaf
 
@@ -412,8 +2487,12 @@ class Prique:
 
 
 class Branch:
-    pass
+    __slots__ = ('_parent', '_total', '_max', '_left', '_right')
+
+
+class Leaf(Branch):
+    __slots__ = ('_keys', '_values', '_handles')
 
 
-class Leaf:
-    pass
+class Handle:
+    __slots__ = ('_leaf',)
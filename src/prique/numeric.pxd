@@ -0,0 +1,71 @@
+import cython
+
+
+cdef int _bisect_int64(long long[::1] keys, long long key, bint right)
+
+cdef int _bisect_float64(double[::1] keys, double key, bint right)
+
+
+cdef class NumericPrique:
+    cdef list _keys
+    cdef list _values
+    cdef object _maxes
+    cdef str _code
+    cdef bint _float
+    cdef int _load
+    cdef int _total
+    cdef list _index
+
+    cpdef init(self, object items=*, str key_type=*, int load=*)
+
+    cdef object _convert(self, object key)
+
+    cdef int _bisect(self, object keys, object key, bint right) except -1
+
+    cdef _build(self, object keys, list values)
+
+    cpdef add_left(self, object key, object value)
+
+    cdef _expand(self, int pos)
+
+    cdef _adjust(self, int pos, int delta)
+
+    cdef int _prefix(self, int pos) except -1
+
+    cdef list _build_index(self)
+
+    cpdef update(self, object items)
+
+    cdef _update(self, object keys, list values)
+
+    cdef tuple _locate(self, int index)
+
+    cdef _delete(self, int pos, int index)
+
+    cdef tuple _find(self, object key, object value)
+
+    cpdef bint discard(self, object key, object value)
+
+    cpdef bint contains(self, object key, object value)
+
+    cpdef peekitem(self, int index=*)
+
+    cpdef getitem(self, int index)
+
+    cpdef popitem(self, int index=*)
+
+    cpdef int len(self)
+
+    cdef tuple _seek(self, object key, bint right)
+
+    cdef int _rank(self, object key, bint right) except -1
+
+    cpdef int bisect_left(self, object key) except -1
+
+    cpdef int bisect_right(self, object key) except -1
+
+    cdef tuple _bounds(self, object min_key, object max_key, bint exc_min,
+                       bint exc_max)
+
+    cpdef int count_range(self, object min_key=*, object max_key=*,
+                          bint exc_min=*, bint exc_max=*) except -1
@@ -0,0 +1,575 @@
+"""Prique Numeric
+
+Prique specialized for int64 or float64 keys.
+
+Keys are stored in typed `array.array` leafs rather than lists of Python
+objects, so each key costs 8 bytes rather than a pointer and a boxed number.
+Leafs are found by bisecting a typed array of leaf maxes and positions by
+bisecting the leaf, both with native comparisons when compiled.
+
+Inserting into a typed leaf moves memory rather than pointers, so leafs are
+larger than in `core.Prique` and held in a flat list. Positions and ranks
+use a binary indexed tree of leaf lengths which is rebuilt lazily after leafs
+are split or merged.
+
+Bulk methods `update_arrays` and `irange_arrays` accept and return buffers,
+such as NumPy arrays, without converting each key. Use
+`numpy.frombuffer(keys, numpy.float64)` to view exported keys without a copy.
+
+"""
+
+import cython
+
+from array import array
+from operator import index as as_int, itemgetter
+
+__all__ = ['NumericPrique']
+
+LOAD = 256
+
+CODES = {'int64': 'q', 'float64': 'd'}
+
+# Buffer formats accepted without conversion by key code.
+FORMATS = {'q': ('q', 'l'), 'd': ('d',)}
+
+
+def _bisect_int64(keys, key, right):
+    lo: cython.int = 0
+    hi: cython.int = len(keys)
+    mid: cython.int
+
+    if right:
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            if key < keys[mid]:
+                hi = mid
+            else:
+                lo = mid + 1
+    else:
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            if keys[mid] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+    return lo
+
+
+def _bisect_float64(keys, key, right):
+    lo: cython.int = 0
+    hi: cython.int = len(keys)
+    mid: cython.int
+
+    if right:
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            if key < keys[mid]:
+                hi = mid
+            else:
+                lo = mid + 1
+    else:
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            if keys[mid] < key:
+                lo = mid + 1
+            else:
+                hi = mid
+
+    return lo
+
+
+class NumericPrique:
+    def init(self, items=(), key_type='float64', load=LOAD):
+        """Initialize prique with (key, value) pairs from items.
+
+        The `key_type` is "int64" or "float64" and keys are converted to it.
+        The `load` sets the maximum leaf size. Items with equal keys are in
+        reverse order, as for update.
+
+        """
+        if key_type not in CODES:
+            raise ValueError('key_type must be "int64" or "float64"')
+
+        if load < 4:
+            raise ValueError('load must be at least 4')
+
+        self._code = CODES[key_type]
+        self._float = key_type == 'float64'
+        self._load = load
+        pairs = list(items)
+        pairs.reverse()
+        pairs.sort(key=itemgetter(0))
+        keys = array(self._code, [self._convert(pair[0]) for pair in pairs])
+        self._build(keys, [pair[1] for pair in pairs])
+
+    def _convert(self, key):
+        # Return key as float or int. Floats are not truncated to int.
+
+        if self._float:
+            return float(key)
+        return as_int(key)
+
+    def _bisect(self, keys, key, right):
+        if self._float:
+            return _bisect_float64(keys, key, right)
+        return _bisect_int64(keys, key, right)
+
+    def _build(self, keys, values):
+        # Cut sorted keys and values into leafs of half the load.
+
+        size: cython.int = self._load >> 1
+        total: cython.int = len(keys)
+
+        starts = range(0, total, size)
+        self._keys = [keys[start:start + size] for start in starts]
+        self._values = [values[start:start + size] for start in starts]
+        self._maxes = array(self._code, [leaf[-1] for leaf in self._keys])
+        self._total = total
+        self._index = None
+
+    def add_left(self, key, value):
+        key = self._convert(key)
+        maxes = self._maxes
+
+        if not self._keys:
+            self._keys.append(array(self._code, [key]))
+            self._values.append([value])
+            maxes.append(key)
+            self._total = 1
+            self._index = None
+            return
+
+        pos: cython.int = self._bisect(maxes, key, False)
+
+        if pos == len(maxes):
+            pos -= 1
+            maxes[pos] = key
+            self._keys[pos].append(key)
+            self._values[pos].append(value)
+        else:
+            keys = self._keys[pos]
+            index: cython.int = self._bisect(keys, key, False)
+            keys.insert(index, key)
+            self._values[pos].insert(index, value)
+
+        self._total += 1
+        self._adjust(pos, 1)
+        self._expand(pos)
+
+    def _expand(self, pos):
+        # Split leaf at pos in half when it exceeds the load.
+
+        keys = self._keys[pos]
+        size: cython.int = len(keys)
+
+        if size > self._load:
+            half: cython.int = size >> 1
+            values = self._values[pos]
+            self._keys.insert(pos + 1, keys[half:])
+            self._values.insert(pos + 1, values[half:])
+            del keys[half:]
+            del values[half:]
+            self._maxes.insert(pos, keys[-1])
+            self._index = None
+
+    def _adjust(self, pos, delta):
+        # Add delta to length of leaf at pos in index, if built.
+
+        index = self._index
+
+        if index is not None:
+            size: cython.int = len(index)
+            pos += 1
+
+            while pos < size:
+                index[pos] += delta
+                pos += pos & -pos
+
+    def _prefix(self, pos):
+        # Return count of items in leafs before pos.
+
+        index = self._build_index()
+        total: cython.int = 0
+
+        while pos > 0:
+            total += index[pos]
+            pos -= pos & -pos
+
+        return total
+
+    def _build_index(self):
+        # Return binary indexed tree of leaf lengths, building it if stale.
+
+        index = self._index
+
+        if index is None:
+            size: cython.int = len(self._keys)
+            pos: cython.int
+            parent: cython.int
+            index = [0] * (size + 1)
+
+            for pos in range(1, size + 1):
+                index[pos] += len(self._keys[pos - 1])
+                parent = pos + (pos & -pos)
+                if parent <= size:
+                    index[parent] += index[pos]
+
+            self._index = index
+
+        return index
+
+    def update(self, items):
+        """Add (key, value) pairs from items.
+
+        Items are placed as by add_left in turn, so items with equal keys
+        within items are in reverse order.
+
+        """
+        pairs = list(items)
+        pairs.reverse()
+        pairs.sort(key=itemgetter(0))
+        keys = array(self._code, [self._convert(pair[0]) for pair in pairs])
+        self._update(keys, [pair[1] for pair in pairs])
+
+    def update_arrays(self, keys, values):
+        """Add keys and values from sequences of equal length.
+
+        Keys in a contiguous buffer with matching 8-byte items, such as a
+        NumPy int64 or float64 array, are copied without conversion.
+        New items precede existing items with equal keys and are in reverse
+        order among themselves, as for update.
+
+        """
+        code = self._code
+        batch = array(code)
+
+        try:
+            view = memoryview(keys)
+        except TypeError:
+            view = None
+
+        if (view is not None and view.c_contiguous and view.itemsize == 8
+                and view.format in FORMATS[code]):
+            with view.cast('B') as data:
+                batch.frombytes(data)
+        else:
+            batch.extend([self._convert(key) for key in keys])
+
+        if view is not None:
+            view.release()
+
+        values = list(values)
+
+        if len(batch) != len(values):
+            raise ValueError('keys and values must have equal length')
+
+        order = sorted(range(len(batch) - 1, -1, -1), key=batch.__getitem__)
+        self._update(
+            array(code, [batch[index] for index in order]),
+            [values[index] for index in order],
+        )
+
+    def _update(self, keys, values):
+        # Add sorted keys and values, rebuilding when the batch is large.
+
+        size: cython.int = len(keys)
+        index: cython.int
+
+        if size == 0:
+            return
+
+        if size > (self._total >> 3):
+            # Large batch: merge with existing items and rebuild.
+
+            for leaf in self._keys:
+                keys.extend(leaf)
+
+            for leaf in self._values:
+                values.extend(leaf)
+
+            order = sorted(range(len(keys)), key=keys.__getitem__)
+            self._build(
+                array(self._code, [keys[index] for index in order]),
+                [values[index] for index in order],
+            )
+        else:
+            for index in range(size - 1, -1, -1):
+                self.add_left(keys[index], values[index])
+
+    def _locate(self, index):
+        # Return leaf position and index within leaf of item at index.
+
+        total: cython.int = self._total
+        pos: cython.int
+        size: cython.int
+        step: cython.int
+
+        if index < 0:
+            index += total
+
+        if index < 0 or index >= total:
+            raise IndexError('index out of range')
+
+        leafs = self._keys
+        size = len(leafs[0])
+
+        if index < size:
+            return 0, index
+
+        size = len(leafs[-1])
+
+        if total - index <= size:
+            return len(leafs) - 1, size - (total - index)
+
+        # Descend the index from its largest power of two.
+
+        tree = self._build_index()
+        size = len(leafs)
+        pos = 0
+        step = 1
+
+        while step <= size:
+            step <<= 1
+
+        step >>= 1
+
+        while step:
+            if pos + step <= size and tree[pos + step] <= index:
+                pos += step
+                index -= tree[pos]
+            step >>= 1
+
+        return pos, index
+
+    def _delete(self, pos, index):
+        # Delete item at index in leaf at pos and merge small leafs.
+
+        keys = self._keys[pos]
+        values = self._values[pos]
+        maxes = self._maxes
+        del keys[index]
+        del values[index]
+        self._total -= 1
+        self._adjust(pos, -1)
+        size: cython.int = len(keys)
+
+        if size > (self._load >> 2):
+            maxes[pos] = keys[-1]
+        elif len(maxes) > 1:
+            if pos == 0:
+                pos = 1
+
+            prev = pos - 1
+            self._keys[prev].extend(self._keys[pos])
+            self._values[prev].extend(self._values[pos])
+            maxes[prev] = self._keys[prev][-1]
+            del self._keys[pos]
+            del self._values[pos]
+            del maxes[pos]
+            self._index = None
+            self._expand(prev)
+        elif size:
+            maxes[pos] = keys[-1]
+        else:
+            del self._keys[pos]
+            del self._values[pos]
+            del maxes[pos]
+            self._index = None
+
+    def _find(self, key, value):
+        # Return leaf position and index of item with key and value or None.
+
+        key = self._convert(key)
+        maxes = self._maxes
+        pos: cython.int = self._bisect(maxes, key, False)
+        count: cython.int = len(maxes)
+
+        if pos == count:
+            return None
+
+        keys = self._keys[pos]
+        index: cython.int = self._bisect(keys, key, False)
+
+        while True:
+            if index == len(keys):
+                pos += 1
+                if pos == count:
+                    return None
+                keys = self._keys[pos]
+                index = 0
+
+            if keys[index] != key:
+                return None
+
+            if self._values[pos][index] == value:
+                return pos, index
+
+            index += 1
+
+    def discard(self, key, value):
+        pos: cython.int
+        index: cython.int
+        location = self._find(key, value)
+
+        if location is None:
+            return False
+
+        pos, index = location
+        self._delete(pos, index)
+        return True
+
+    def contains(self, key, value):
+        return self._find(key, value) is not None
+
+    def peekitem(self, index=-1):
+        pos, index = self._locate(index)
+        return self._keys[pos][index], self._values[pos][index]
+
+    def getitem(self, index):
+        return self.peekitem(index)
+
+    def popitem(self, index=-1):
+        pos, index = self._locate(index)
+        item = self._keys[pos][index], self._values[pos][index]
+        self._delete(pos, index)
+        return item
+
+    def len(self):
+        return self._total
+
+    def _seek(self, key, right):
+        # Return leaf position and index where key would be inserted.
+
+        maxes = self._maxes
+        pos: cython.int = self._bisect(maxes, key, right)
+
+        if pos == len(maxes):
+            return pos, 0
+
+        return pos, self._bisect(self._keys[pos], key, right)
+
+    def _rank(self, key, right):
+        pos: cython.int
+        index: cython.int
+        pos, index = self._seek(self._convert(key), right)
+        return self._prefix(pos) + index
+
+    def bisect_left(self, key):
+        "Return index of first item with key greater than or equal to key."
+        return self._rank(key, False)
+
+    def bisect_right(self, key):
+        "Return index of first item with key greater than key."
+        return self._rank(key, True)
+
+    def _bounds(self, min_key, max_key, exc_min, exc_max):
+        # Return leaf positions and indexes bounding keys between min key and
+        # max key.
+
+        count = len(self._maxes)
+
+        if min_key is None:
+            start = 0, 0
+        else:
+            start = self._seek(self._convert(min_key), exc_min)
+
+        if max_key is None:
+            stop = count, 0
+        else:
+            stop = self._seek(self._convert(max_key), not exc_max)
+
+        return start, stop
+
+    def count_range(self, min_key=None, max_key=None, exc_min=False,
+                    exc_max=False):
+        "Return count of items with keys between min key and max key."
+        start, stop = self._bounds(min_key, max_key, exc_min, exc_max)
+
+        if stop <= start:
+            return 0
+
+        (start_pos, start_index), (stop_pos, stop_index) = start, stop
+        stop_rank: cython.int = self._prefix(stop_pos) + stop_index
+        start_rank: cython.int = self._prefix(start_pos) + start_index
+        return stop_rank - start_rank
+
+    def irange_arrays(self, min_key=None, max_key=None, exc_min=False,
+                      exc_max=False):
+        """Return pair of keys array and values list between min key and
+        max key.
+
+        Keys are copied from the leafs as blocks of memory.
+
+        """
+        keys = array(self._code)
+        values = []
+        start, stop = self._bounds(min_key, max_key, exc_min, exc_max)
+
+        if stop <= start:
+            return keys, values
+
+        (start_pos, start_index), (stop_pos, stop_index) = start, stop
+        pos: cython.int
+
+        for pos in range(start_pos, stop_pos + 1):
+            if pos == len(self._maxes):
+                break
+            begin = start_index if pos == start_pos else 0
+            end = stop_index if pos == stop_pos else len(self._keys[pos])
+            keys.extend(self._keys[pos][begin:end])
+            values.extend(self._values[pos][begin:end])
+
+        return keys, values
+
+    def __iter__(self):
+        return self.irange()
+
+    def __reversed__(self):
+        return self.irange(reverse=True)
+
+    def irange(self, min_key=None, max_key=None, exc_min=False, exc_max=False,
+               reverse=False):
+        "Iterate items with keys between min key and max key."
+        start, stop = self._bounds(min_key, max_key, exc_min, exc_max)
+
+        if stop <= start:
+            return
+
+        (start_pos, start_index), (stop_pos, stop_index) = start, stop
+        positions = range(start_pos, min(stop_pos + 1, len(self._maxes)))
+
+        for pos in reversed(positions) if reverse else positions:
+            keys = self._keys[pos]
+            values = self._values[pos]
+            begin = start_index if pos == start_pos else 0
+            end = stop_index if pos == stop_pos else len(keys)
+            indexes = range(begin, end)
+
+            for index in reversed(indexes) if reverse else indexes:
+                yield keys[index], values[index]
+
+    def check(self):
+        "Check invariants of leafs and maxes. Return 0 when valid."
+        leafs = self._keys
+        maxes = self._maxes
+        assert len(leafs) == len(self._values) == len(maxes)
+        assert sum(len(leaf) for leaf in leafs) == self._total
+
+        if self._index is not None:
+            index = self._index
+            self._index = None
+            assert index == self._build_index()
+        prev = None
+
+        for leaf, values, max_key in zip(leafs, self._values, maxes):
+            assert leaf.typecode == self._code
+            assert 0 < len(leaf) <= self._load
+            assert len(leaf) == len(values)
+            assert leaf[-1] == max_key
+            assert list(leaf) == sorted(leaf)
+            if prev is not None:
+                assert not leaf[0] < prev
+            prev = max_key
+
+        return 0
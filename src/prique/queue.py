@@ -0,0 +1,250 @@
+"""Prique Queue
+
+Thread-safe blocking priority queue built on `core.Prique`.
+
+The interface follows `queue.PriorityQueue` from the standard library but
+items are put as separate key and value arguments and got as (key, value)
+pairs. Bulk methods `put_many` and `get_many` acquire the lock once per
+batch rather than once per item.
+
+"""
+
+import threading
+
+from queue import Empty, Full
+from time import monotonic
+
+from .core import Prique
+
+__all__ = ['Empty', 'Full', 'PriorityQueue']
+
+
+class PriorityQueue:
+    """Priority Queue
+
+    Items with the smallest key are got first. When `maxsize` is greater
+    than zero, puts block while the queue is full. When `stable` is set,
+    items with equal keys are got in the order they were put, otherwise in
+    reverse order. Other keyword arguments are passed to `core.Prique.init`,
+    for example `handles=True` to return handles from put for use with
+    cancel and change. Maxlen is not supported, use maxsize to bound the
+    queue. Key functions are not supported, keys are passed to put.
+
+    """
+
+    def __init__(self, maxsize=0, stable=False, **options):
+        if options.get('maxlen'):
+            raise ValueError('maxlen is not supported')
+
+        if options.get('key') is not None:
+            raise ValueError('key is not supported')
+
+        self.maxsize = maxsize
+        self.stable = stable
+        self._prique = Prique()
+        self._prique.init(**options)
+        self.mutex = threading.Lock()
+        self.not_empty = threading.Condition(self.mutex)
+        self.not_full = threading.Condition(self.mutex)
+        self.all_tasks_done = threading.Condition(self.mutex)
+        self.unfinished_tasks = 0
+
+    def task_done(self):
+        with self.all_tasks_done:
+            unfinished = self.unfinished_tasks - 1
+
+            if unfinished <= 0:
+                if unfinished < 0:
+                    raise ValueError('task_done() called too many times')
+
+                self.all_tasks_done.notify_all()
+
+            self.unfinished_tasks = unfinished
+
+    def join(self):
+        with self.all_tasks_done:
+            while self.unfinished_tasks:
+                self.all_tasks_done.wait()
+
+    def qsize(self):
+        with self.mutex:
+            return self._prique.len()
+
+    def empty(self):
+        with self.mutex:
+            return not self._prique.len()
+
+    def full(self):
+        with self.mutex:
+            return 0 < self.maxsize <= self._prique.len()
+
+    def _wait_not_full(self, block, timeout):
+        # Wait for room in the queue while holding the mutex.
+
+        prique = self._prique
+
+        if self.maxsize <= 0:
+            return
+
+        if not block:
+            if prique.len() >= self.maxsize:
+                raise Full
+        elif timeout is None:
+            while prique.len() >= self.maxsize:
+                self.not_full.wait()
+        elif timeout < 0:
+            raise ValueError("'timeout' must be a non-negative number")
+        else:
+            endtime = monotonic() + timeout
+            while prique.len() >= self.maxsize:
+                remaining = endtime - monotonic()
+                if remaining <= 0.0:
+                    raise Full
+                self.not_full.wait(remaining)
+
+    def _wait_not_empty(self, block, timeout):
+        # Wait for an item in the queue while holding the mutex.
+
+        prique = self._prique
+
+        if not block:
+            if not prique.len():
+                raise Empty
+        elif timeout is None:
+            while not prique.len():
+                self.not_empty.wait()
+        elif timeout < 0:
+            raise ValueError("'timeout' must be a non-negative number")
+        else:
+            endtime = monotonic() + timeout
+            while not prique.len():
+                remaining = endtime - monotonic()
+                if remaining <= 0.0:
+                    raise Empty
+                self.not_empty.wait(remaining)
+
+    def put(self, key, value, block=True, timeout=None):
+        "Put item into queue and return its handle, if any."
+        with self.not_full:
+            self._wait_not_full(block, timeout)
+            if self.stable:
+                handle = self._prique.add_right(key, value)
+            else:
+                handle = self._prique.add_left(key, value)
+
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+            return handle
+
+    def put_nowait(self, key, value):
+        return self.put(key, value, block=False)
+
+    def put_many(self, items, block=True, timeout=None):
+        """Put (key, value) pairs from items into queue.
+
+        Pairs are added in batches under a single lock acquisition. In a
+        bounded queue each batch fills the available room and puts block
+        between batches as for `put`, with `timeout` covering the whole call.
+        If it runs out, Full is raised and pairs already added remain in the
+        queue. Without blocking, Full is raised unless there is room for all
+        pairs, and none are added. When stable, pairs are added one at a time
+        after items with equal keys.
+
+        """
+        items = list(items)
+        start = 0
+        endtime = None
+
+        if block and timeout is not None:
+            if timeout < 0:
+                raise ValueError("'timeout' must be a non-negative number")
+            endtime = monotonic() + timeout
+
+        while start < len(items):
+            with self.not_full:
+                prique = self._prique
+
+                if not block and self.maxsize > 0:
+                    if prique.len() + len(items) > self.maxsize:
+                        raise Full
+
+                if endtime is not None:
+                    timeout = max(endtime - monotonic(), 0.0)
+
+                self._wait_not_full(block, timeout)
+
+                if self.maxsize > 0:
+                    stop = start + self.maxsize - prique.len()
+                else:
+                    stop = len(items)
+
+                batch = items[start:stop]
+
+                if self.stable:
+                    add_right = prique.add_right
+                    for key, value in batch:
+                        add_right(key, value)
+                else:
+                    prique.update(batch)
+
+                self.unfinished_tasks += len(batch)
+                self.not_empty.notify(len(batch))
+
+            start += len(batch)
+
+    def get(self, block=True, timeout=None):
+        "Remove and return (key, value) pair with the smallest key."
+        with self.not_empty:
+            self._wait_not_empty(block, timeout)
+            item = self._prique.popitem(0)
+            self.not_full.notify()
+            return item
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def get_many(self, count, block=True, timeout=None):
+        """Remove and return up to count pairs with the smallest keys.
+
+        Blocks as for `get` until at least one item is available and then
+        returns as many as are available up to count.
+
+        """
+        with self.not_empty:
+            self._wait_not_empty(block, timeout)
+            prique = self._prique
+            count = min(count, prique.len())
+            items = [prique.popitem(0) for _ in range(count)]
+            self.not_full.notify(count)
+            return items
+
+    def peek(self):
+        "Return (key, value) pair with the smallest key without removing it."
+        with self.mutex:
+            if not self._prique.len():
+                raise Empty
+            return self._prique.peekitem(0)
+
+    def cancel(self, handle):
+        "Remove item by handle and return its (key, value) pair."
+        with self.mutex:
+            item = self._prique.remove(handle)
+            self.unfinished_tasks -= 1
+
+            if not self.unfinished_tasks:
+                self.all_tasks_done.notify_all()
+
+            self.not_full.notify()
+            return item
+
+    def change(self, handle, key):
+        "Change key of item by handle."
+        with self.mutex:
+            return self._prique.change(handle, key, self.stable)
+
+    def irange(self, min_key=None, max_key=None, exc_min=False, exc_max=False):
+        "Return list of pairs with keys between min key and max key."
+        with self.mutex:
+            return list(
+                self._prique.irange(min_key, max_key, exc_min, exc_max)
+            )
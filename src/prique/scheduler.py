@@ -0,0 +1,76 @@
+"""Prique Scheduler
+
+Timer store built on `core.Prique` for retries, timeouts, leases and other
+deadlines.
+
+Items are scheduled at a time, typically from `time.monotonic`, and are
+collected in bulk by `pop_due` which detaches whole leafs from the left end
+of the prique rather than popping items one at a time.
+
+"""
+
+from .core import Prique
+
+__all__ = ['Scheduler']
+
+
+class Scheduler:
+    """Scheduler
+
+    Items scheduled at the same time are returned in reverse order of
+    scheduling, or in order of scheduling when `stable` is set. Other
+    keyword arguments are passed to `core.Prique.init`, for example `load`
+    to set the leaf size. Handles are always enabled and maxlen is not
+    supported, since every scheduled item must get a handle.
+
+    """
+
+    def __init__(self, stable=False, **options):
+        if not options.pop('handles', True):
+            raise ValueError('handles are required')
+
+        if options.get('maxlen'):
+            raise ValueError('maxlen is not supported')
+
+        self._stable = stable
+        self._prique = Prique()
+        self._prique.init(handles=True, **options)
+
+    def __repr__(self):
+        return '<%s len=%r next_deadline=%r>' % (
+            type(self).__name__, len(self), self.next_deadline()
+        )
+
+    def __len__(self):
+        return self._prique.len()
+
+    def schedule(self, when, item):
+        "Schedule item at when and return its handle."
+        if self._stable:
+            return self._prique.add_right(when, item)
+        return self._prique.add_left(when, item)
+
+    def cancel(self, handle):
+        """Cancel scheduled item by handle and return its (when, item) pair.
+
+        Raises ValueError if the item is already due or cancelled.
+
+        """
+        return self._prique.remove(handle)
+
+    def reschedule(self, handle, when):
+        "Move scheduled item by handle to when. The handle remains valid."
+        return self._prique.change(handle, when, self._stable)
+
+    def next_deadline(self):
+        "Return time of the earliest scheduled item or None when empty."
+        prique = self._prique
+
+        if not prique.len():
+            return None
+
+        return prique.peekitem(0)[0]
+
+    def pop_due(self, now):
+        "Remove and return list of (when, item) pairs with when <= now."
+        return self._prique.popto(now)
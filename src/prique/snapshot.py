@@ -0,0 +1,168 @@
+"""Prique Snapshot
+
+Save and load `core.Prique` in a compact binary format.
+
+A snapshot is a fixed header followed by a block of keys and a block of
+values in sorted order. Loading rebuilds the prique bottom-up from the
+blocks with `core.Prique.init_sorted`, so no keys are compared and no pair
+is created per item.
+
+When every key is an int that fits in 64 bits, or every key is a float, the
+key block holds the raw little-endian numbers. Otherwise, and always for
+values, the block is a pickled list. Use `load_mmap` to read a snapshot file
+through `mmap` without first copying it into memory.
+
+Handles are not saved. Keyword arguments to the loaders are passed to
+`core.Prique.init_sorted`, for example `indexed=True` to rebuild the lookup.
+
+"""
+
+import array
+import mmap
+import pickle
+import struct
+import sys
+
+from .core import Prique
+
+__all__ = ['save', 'load', 'load_mmap']
+
+MAGIC = b'PRQS'
+VERSION = 1
+
+# Key block encodings.
+PICKLED = 0
+INT64 = 1
+FLOAT64 = 2
+
+CODES = {INT64: 'q', FLOAT64: 'd'}
+
+# Header is magic, version, key encoding and item count. Each block is
+# prefixed by its size in bytes and numeric key blocks start 8-byte aligned.
+HEADER = struct.Struct('<4sHHQ')
+SIZE = struct.Struct('<Q')
+
+
+def _encoding(keys):
+    # Return encoding for key block.
+
+    if keys and all(type(key) is int for key in keys):
+        if -(1 << 63) <= min(keys) and max(keys) < (1 << 63):
+            return INT64
+    elif keys and all(type(key) is float for key in keys):
+        return FLOAT64
+
+    return PICKLED
+
+
+def _numbers(buffer, code):
+    # Return list of numbers from little-endian buffer.
+
+    if sys.byteorder == 'little':
+        with buffer.cast(code) as view:
+            return view.tolist()
+
+    numbers = array.array(code)
+    numbers.frombytes(buffer)
+    numbers.byteswap()
+    return numbers.tolist()
+
+
+def _write(file, block):
+    # Write block to file prefixed by its size in bytes.
+
+    with memoryview(block) as view:
+        file.write(SIZE.pack(view.nbytes))
+        file.write(view)
+
+
+def save(prique, file):
+    "Write snapshot of prique to binary file object."
+    keys, values = prique.dump()
+    encoding = _encoding(keys)
+    file.write(HEADER.pack(MAGIC, VERSION, encoding, len(keys)))
+
+    if encoding == PICKLED:
+        block = pickle.dumps(keys, protocol=pickle.HIGHEST_PROTOCOL)
+    else:
+        block = array.array(CODES[encoding], keys)
+        if sys.byteorder != 'little':
+            block.byteswap()
+
+    del keys
+    _write(file, block)
+    del block
+    _write(file, pickle.dumps(values, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def _parse(buffer, options):
+    # Return prique from snapshot in memoryview buffer. Slices of buffer are
+    # released before returning so a mapped file can be closed.
+
+    offset = HEADER.size
+
+    if len(buffer) < offset:
+        raise ValueError('snapshot is truncated')
+
+    magic, version, encoding, count = HEADER.unpack_from(buffer)
+
+    if magic != MAGIC:
+        raise ValueError('not a prique snapshot')
+
+    if version != VERSION:
+        raise ValueError('unsupported snapshot version %r' % version)
+
+    if encoding != PICKLED and encoding not in CODES:
+        raise ValueError('unsupported key encoding %r' % encoding)
+
+    bounds = []
+
+    for _ in range(2):
+        if len(buffer) < offset + SIZE.size:
+            raise ValueError('snapshot is truncated')
+
+        (size,) = SIZE.unpack_from(buffer, offset)
+        offset += SIZE.size
+
+        if len(buffer) < offset + size:
+            raise ValueError('snapshot is truncated')
+
+        bounds.append((offset, offset + size))
+        offset += size
+
+    (key_start, key_stop), (value_start, value_stop) = bounds
+
+    with buffer[key_start:key_stop] as block:
+        if encoding == PICKLED:
+            keys = pickle.loads(block)
+        else:
+            keys = _numbers(block, CODES[encoding])
+
+    with buffer[value_start:value_stop] as block:
+        values = pickle.loads(block)
+
+    if not len(keys) == len(values) == count:
+        raise ValueError('snapshot item count does not match')
+
+    prique = Prique()
+    prique.init_sorted(keys, values, **options)
+    return prique
+
+
+def load(file, **options):
+    "Return prique from snapshot in binary file object."
+    with memoryview(file.read()) as buffer:
+        return _parse(buffer, options)
+
+
+def load_mmap(path, **options):
+    """Return prique from snapshot file at path.
+
+    The file is mapped into memory and numeric keys are read directly from
+    the mapping, avoiding a copy of the file contents.
+
+    """
+    with open(path, 'rb') as reader:
+        with mmap.mmap(reader.fileno(), 0, access=mmap.ACCESS_READ) as mapping:
+            with memoryview(mapping) as buffer:
+                return _parse(buffer, options)
@@ -0,0 +1,558 @@
+"""Prique Spill
+
+Out-of-core prique that keeps hot pages in memory and spills cold pages to a
+local file.
+
+Items are kept in pages, each a `core.Prique` holding a contiguous range of
+keys. A spine of page totals and smallest and largest keys stays in memory,
+with a binary indexed tree of page totals, so ranks, counts and ranges cost
+time logarithmic in the count of pages and only load the pages at their
+bounds. Pages are loaded on access and the least recently used pages are
+spilled when more than `budget` items are in memory. Access skewed toward
+the smallest keys, as in a priority queue, keeps the first pages in memory
+so pop-min costs about the same as for an in-memory prique.
+
+Spilled pages are stored with `snapshot` and a page that is loaded but not
+changed is spilled again without a write. Space of stale pages is reclaimed
+by rewriting the file when it exceeds the space of live pages.
+
+"""
+
+import collections
+import io
+import os
+import tempfile
+
+from bisect import bisect_left, bisect_right
+
+from . import snapshot
+from .core import Prique
+
+__all__ = ['SpillPrique']
+
+# Space of stale pages that is tolerated before rewriting the file.
+MIN_GARBAGE = 1 << 20
+
+
+class _Page:
+    # Page of items with summaries kept while spilled.
+
+    __slots__ = ('prique', 'total', 'min', 'offset', 'size')
+
+    def __init__(self, prique):
+        self.prique = prique
+        self.total = prique.len()
+        self.min = None
+        self.offset = None
+        self.size = 0
+
+
+class SpillPrique:
+    """Spill Prique
+
+    The `budget` is the maximum count of items kept in memory and
+    `page_size` the count of items at which a page is split. Pages are
+    spilled to a scratch file at `path`, or an anonymous temporary file by
+    default, which is removed by close. Other keyword arguments are passed to
+    `core.Prique.init`, for example `load` to set the leaf size. Handles,
+    indexed and maxlen are not supported.
+
+    """
+
+    def __init__(self, path=None, budget=1_000_000, page_size=10_000,
+                 **options):
+        if budget < 1:
+            raise ValueError('budget must be at least 1')
+
+        if page_size < 2:
+            raise ValueError('page_size must be at least 2')
+
+        for name in ('handles', 'indexed', 'maxlen'):
+            if options.get(name):
+                raise ValueError('%s is not supported' % name)
+
+        self._path = path
+        self._budget = budget
+        self._page_size = page_size
+        self._options = options
+
+        if path is None:
+            self._file = tempfile.TemporaryFile()
+        else:
+            self._file = open(path, 'w+b')
+
+        self._total = 0
+        self._live = 0
+        self._garbage = 0
+        self._resident = 0
+        self._lru = collections.OrderedDict()
+        page = _Page(self._new())
+        self._pages = [page]
+        self._maxes = [None]
+        self._index = None
+        self._lru[page] = None
+
+    def __repr__(self):
+        return '<%s len=%r pages=%r resident=%r>' % (
+            type(self).__name__, self.len(), len(self._pages), self._resident
+        )
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        "Close and remove spill file."
+        self._file.close()
+
+        if self._path is not None and os.path.exists(self._path):
+            os.remove(self._path)
+
+    def _new(self, pairs=()):
+        prique = Prique()
+        keys = [pair[0] for pair in pairs]
+        values = [pair[1] for pair in pairs]
+        prique.init_sorted(keys, values, **self._options)
+        return prique
+
+    def _first(self, page):
+        # Return smallest key of page without loading it.
+
+        if page.prique is None:
+            return page.min
+        return page.prique.peekitem(0)[0]
+
+    def _fetch(self, index):
+        # Return prique of page at index, loading it and spilling least
+        # recently used pages when over budget.
+
+        page = self._pages[index]
+        lru = self._lru
+
+        if page.prique is None:
+            file = self._file
+            file.seek(page.offset)
+            buffer = io.BytesIO(file.read(page.size))
+            page.prique = snapshot.load(buffer, **self._options)
+            self._resident += page.total
+            lru[page] = None
+            self._shrink()
+        else:
+            lru.move_to_end(page)
+
+        return page.prique
+
+    def _shrink(self):
+        # Spill least recently used pages until within budget. The most
+        # recently used page always remains.
+
+        lru = self._lru
+
+        while self._resident > self._budget and len(lru) > 1:
+            page, _ = lru.popitem(last=False)
+            self._spill(page)
+
+    def _spill(self, page):
+        prique = page.prique
+
+        if page.offset is None:
+            file = self._file
+            file.seek(0, io.SEEK_END)
+            page.offset = file.tell()
+            snapshot.save(prique, file)
+            page.size = file.tell() - page.offset
+            self._live += page.size
+
+        page.min = prique.peekitem(0)[0]
+        page.prique = None
+        self._resident -= page.total
+
+        if self._garbage > max(self._live, MIN_GARBAGE):
+            self._compact()
+
+    def _discard(self, page):
+        # Mark spilled copy of page as stale.
+
+        if page.offset is not None:
+            self._live -= page.size
+            self._garbage += page.size
+            page.offset = None
+            page.size = 0
+
+    def _compact(self):
+        # Copy spilled pages to a new file and replace the old file.
+
+        old = self._file
+
+        if self._path is None:
+            new = tempfile.TemporaryFile()
+        else:
+            new = open(self._path + '.compact', 'w+b')
+
+        for page in self._pages:
+            if page.offset is not None:
+                old.seek(page.offset)
+                data = old.read(page.size)
+                page.offset = new.tell()
+                new.write(data)
+
+        old.close()
+
+        if self._path is not None:
+            new.close()
+            os.replace(self._path + '.compact', self._path)
+            new = open(self._path, 'r+b')
+
+        self._file = new
+        self._garbage = 0
+
+    def _changed(self, index):
+        # Update summaries of page at index after its prique changed. Empty
+        # pages are removed and large pages are split.
+
+        pages = self._pages
+        page = pages[index]
+        prique = page.prique
+        total = prique.len()
+        self._total += total - page.total
+        self._resident += total - page.total
+        self._adjust(index, total - page.total)
+        page.total = total
+        self._discard(page)
+
+        if total == 0:
+            if len(pages) > 1:
+                del pages[index]
+                del self._maxes[index]
+                del self._lru[page]
+                self._index = None
+            else:
+                self._maxes[index] = None
+            return
+
+        self._maxes[index] = prique.peekitem(-1)[0]
+
+        if total > self._page_size:
+            # Split at middle key or the next larger key.
+
+            key = prique.getitem(total >> 1)[0]
+
+            if not prique.bisect_left(key):
+                stop = prique.bisect_right(key)
+                key = prique.getitem(stop)[0] if stop < total else None
+
+            if key is not None:
+                other = _Page(prique.split(key))
+                page.total = prique.len()
+                pages.insert(index + 1, other)
+                self._maxes[index] = prique.peekitem(-1)[0]
+                self._maxes.insert(index + 1, other.prique.peekitem(-1)[0])
+                self._lru[other] = None
+                self._lru.move_to_end(page)
+                self._index = None
+
+        self._shrink()
+
+    def _adjust(self, index, delta):
+        # Add delta to total of page at index in index tree, if built.
+
+        tree = self._index
+
+        if tree is not None:
+            size = len(tree)
+            index += 1
+
+            while index < size:
+                tree[index] += delta
+                index += index & -index
+
+    def _prefix(self, index):
+        # Return count of items in pages before index.
+
+        tree = self._build_index()
+        total = 0
+
+        while index > 0:
+            total += tree[index]
+            index -= index & -index
+
+        return total
+
+    def _build_index(self):
+        # Return binary indexed tree of page totals, building it if stale.
+
+        tree = self._index
+
+        if tree is None:
+            pages = self._pages
+            size = len(pages)
+            tree = [0] * (size + 1)
+
+            for index in range(1, size + 1):
+                tree[index] += pages[index - 1].total
+                parent = index + (index & -index)
+                if parent <= size:
+                    tree[parent] += tree[index]
+
+            self._index = tree
+
+        return tree
+
+    def _locate(self, index):
+        # Return page index and position of item at index. The first and
+        # last pages are checked before descending the index tree.
+
+        pages = self._pages
+        total = self._total
+
+        if index < 0:
+            index += total
+
+        if index < 0 or index >= total:
+            raise IndexError('index out of range')
+
+        size = pages[0].total
+
+        if index < size:
+            return 0, index
+
+        size = pages[-1].total
+
+        if total - index <= size:
+            return len(pages) - 1, size - (total - index)
+
+        # Descend the index tree from its largest power of two.
+
+        tree = self._build_index()
+        size = len(pages)
+        page_index = 0
+        step = 1 << (size.bit_length() - 1)
+
+        while step:
+            if page_index + step <= size and tree[page_index + step] <= index:
+                page_index += step
+                index -= tree[page_index]
+            step >>= 1
+
+        return page_index, index
+
+    def len(self):
+        return self._total
+
+    def add_left(self, key, value):
+        maxes = self._maxes
+
+        if maxes[-1] is None:
+            index = 0
+        else:
+            index = bisect_left(maxes, key)
+            if index == len(maxes):
+                index -= 1
+
+        self._fetch(index).add_left(key, value)
+        self._changed(index)
+
+    def update(self, items):
+        """Add (key, value) pairs from items.
+
+        When empty, items are sorted and cut into pages which are spilled as
+        they exceed the budget, so the items need not fit in memory at once
+        beyond the sorted list. Items are placed as by add_left in turn, so
+        items with equal keys within items are in reverse order.
+
+        """
+        if self._total:
+            for key, value in items:
+                self.add_left(key, value)
+            return
+
+        pairs = list(items)
+        pairs.reverse()
+        pairs.sort(key=lambda pair: pair[0])
+        page_size = self._page_size
+        size = (page_size >> 1) or 1
+        pages = []
+        maxes = []
+        lru = self._lru
+        lru.clear()
+        self._resident = 0
+
+        for start in range(0, len(pairs), size):
+            page = _Page(self._new(pairs[start:start + size]))
+            pages.append(page)
+            maxes.append(pairs[start + page.total - 1][0])
+            lru[page] = None
+            self._total += page.total
+            self._resident += page.total
+            self._shrink()
+
+        if pages:
+            self._pages = pages
+            self._maxes = maxes
+            self._index = None
+        else:
+            lru[self._pages[0]] = None
+
+    def discard(self, key, value):
+        "Remove first item with key and value. Return True if removed."
+        pages = self._pages
+        index = bisect_left(self._maxes, key) if self._total else len(pages)
+
+        while index < len(pages) and not key < self._first(pages[index]):
+            if self._fetch(index).discard(key, value):
+                self._changed(index)
+                return True
+            index += 1
+
+        return False
+
+    def peekitem(self, index=-1):
+        page_index, pos = self._locate(index)
+        return self._fetch(page_index).getitem(pos)
+
+    def popitem(self, index=-1):
+        page_index, pos = self._locate(index)
+        item = self._fetch(page_index).popitem(pos)
+        self._changed(page_index)
+        return item
+
+    def getitem(self, index):
+        return self.peekitem(index)
+
+    def _rank(self, key, right):
+        # Sum page totals before key and load only the page at key when key
+        # falls within its keys.
+
+        pages = self._pages
+
+        if not self._total:
+            return 0
+
+        if right:
+            index = bisect_right(self._maxes, key)
+        else:
+            index = bisect_left(self._maxes, key)
+
+        rank = self._prefix(index)
+
+        if index == len(pages):
+            return rank
+
+        first = self._first(pages[index])
+
+        if right:
+            if key < first:
+                return rank
+            return rank + self._fetch(index).bisect_right(key)
+        else:
+            if not first < key:
+                return rank
+            return rank + self._fetch(index).bisect_left(key)
+
+    def bisect_left(self, key):
+        "Return index of first item with key greater than or equal to key."
+        return self._rank(key, False)
+
+    def bisect_right(self, key):
+        "Return index of first item with key greater than key."
+        return self._rank(key, True)
+
+    def count_range(self, min_key=None, max_key=None, exc_min=False,
+                    exc_max=False):
+        "Return count of items with keys between min key and max key."
+        start = 0
+
+        if min_key is not None:
+            start = self._rank(min_key, exc_min)
+
+        stop = self._total
+
+        if max_key is not None:
+            stop = self._rank(max_key, not exc_max)
+
+        return stop - start if start < stop else 0
+
+    def __iter__(self):
+        return self.irange()
+
+    def __reversed__(self):
+        return self.irange(reverse=True)
+
+    def irange(self, min_key=None, max_key=None, exc_min=False, exc_max=False,
+               reverse=False):
+        """Iterate items with keys between min key and max key.
+
+        Pages entirely outside the range are skipped without loading them.
+
+        """
+        if not self._total:
+            return
+
+        pages = self._pages
+        maxes = self._maxes
+
+        if min_key is None:
+            start = 0
+        elif exc_min:
+            start = bisect_right(maxes, min_key)
+        else:
+            start = bisect_left(maxes, min_key)
+
+        stop = start
+
+        while stop < len(pages):
+            if max_key is not None:
+                first = self._first(pages[stop])
+                if exc_max:
+                    if not first < max_key:
+                        break
+                elif max_key < first:
+                    break
+            stop += 1
+
+        indexes = range(start, stop)
+
+        for index in reversed(indexes) if reverse else indexes:
+            prique = self._fetch(index)
+            yield from prique.irange(min_key, max_key, exc_min, exc_max, reverse)
+
+    def check(self):
+        "Check invariants of pages and summaries. Return 0 when valid."
+        pages = self._pages
+        resident = 0
+        prev = None
+        assert len(pages) == len(self._maxes)
+        assert set(self._lru) == {page for page in pages if page.prique is not None}
+
+        for page, max_key in zip(pages, self._maxes):
+            if page.prique is None:
+                assert page.offset is not None
+                assert page.total > 0
+                first = page.min
+            else:
+                assert page.total == page.prique.len()
+                resident += page.total
+                if not page.total:
+                    assert len(pages) == 1
+                    continue
+                assert page.prique.check() == 0
+                assert page.prique.peekitem(-1)[0] == max_key
+                first = page.prique.peekitem(0)[0]
+
+            assert not max_key < first
+            if prev is not None:
+                assert not first < prev
+            prev = max_key
+
+        assert sum(page.total for page in pages) == self._total
+
+        if self._index is not None:
+            tree = self._index
+            self._index = None
+            assert tree == self._build_index()
+
+        assert resident == self._resident
+        assert resident <= self._budget or len(self._lru) == 1
+        return 0
@@ -1,55 +1,623 @@
-import sortedcontainers
+"""Prique Benchmark
+
+Time operations of `core.Prique` and competing implementations over several
+sizes and key distributions, and compare runs to flag regressions.
+
+    python tests/benchmark.py run --sizes 1e3,1e5 --output base.json
+    python tests/benchmark.py run --sizes 1e3,1e5 --output head.json
+    python tests/benchmark.py compare base.json head.json
+
+Implementations that fail to import or construct are skipped, as are
+operations an implementation does not support.
+
+"""
+
+import argparse
+import datetime
+import gc
+import heapq
+import json
+import platform
 import random
-import timeit
+import sys
+import time
+import tracemalloc
 
-from bintrees import AVLTree, RBTree  # Works on Python 3.9
 from collections import deque
 from itertools import starmap
+
 from prique import core
 
-print(core.__file__)
-rand = random.Random(0)
-# values = [rand.randrange(1000) for _ in range(1_000_000)]
-values = list(range(1_000_000))
-rand.shuffle(values)
-pairs = list(zip(values, values))
-
-times = timeit.repeat(
-    'deque(map(s.add, values), maxlen=0)',
-    setup='s = sortedcontainers.SortedList()',
-    repeat=5,
-    number=1,
-    globals=globals(),
-)
-
-print('SortedList:', times)
-
-times = timeit.repeat(
-    'deque(starmap(p.add_left, pairs), maxlen=0)',
-    setup='p = core.Prique(); p.init()',
-    repeat=5,
-    number=1,
-    globals=globals(),
-)
-
-print('Prique:', times)
-
-times = timeit.repeat(
-    'deque(starmap(r.insert, pairs), maxlen=0)',
-    setup='r = RBTree()',
-    repeat=5,
-    number=1,
-    globals=globals(),
-)
-
-print('RBTree:', times)
-
-# times = timeit.repeat(
-#     'r.update(pairs)',
-#     setup='r = AVLTree()',
-#     repeat=5,
-#     number=1,
-#     globals=globals(),
-# )
-
-# print('AVLTree:', times)
+IMPLS = {}
+
+
+def impl(name):
+    def register(cls):
+        IMPLS[name] = cls
+        return cls
+
+    return register
+
+
+@impl('prique')
+class PriqueImpl:
+    def __init__(self, pairs=()):
+        self.prique = core.Prique()
+        self.prique.init(pairs)
+
+    def insert(self, pairs):
+        deque(starmap(self.prique.add_left, pairs), maxlen=0)
+
+    def pop_min(self, count):
+        popitem = self.prique.popitem
+        for _ in range(count):
+            popitem(0)
+
+    def pop_max(self, count):
+        popitem = self.prique.popitem
+        for _ in range(count):
+            popitem(-1)
+
+    def discard(self, pairs):
+        deque(starmap(self.prique.discard, pairs), maxlen=0)
+
+    def getitem(self, indexes):
+        deque(map(self.prique.getitem, indexes), maxlen=0)
+
+    def irange(self, bounds):
+        irange = self.prique.irange
+        for min_key, max_key in bounds:
+            deque(irange(min_key, max_key, exc_max=True), maxlen=0)
+
+    def update(self, pairs):
+        self.prique.update(pairs)
+
+    def split_join(self, keys):
+        prique = self.prique
+        for key in keys:
+            prique.join(prique.split(key))
+
+    def top_k(self, pairs, count):
+        prique = core.Prique()
+        prique.init(maxlen=count)
+        deque(starmap(prique.add_left, pairs), maxlen=0)
+
+
+@impl('heapq')
+class HeapqImpl:
+    def __init__(self, pairs=()):
+        self.heap = list(pairs)
+        heapq.heapify(self.heap)
+
+    def insert(self, pairs):
+        heap = self.heap
+        heappush = heapq.heappush
+        for pair in pairs:
+            heappush(heap, pair)
+
+    def pop_min(self, count):
+        heap = self.heap
+        heappop = heapq.heappop
+        for _ in range(count):
+            heappop(heap)
+
+
+@impl('sortedlist')
+class SortedListImpl:
+    def __init__(self, pairs=()):
+        from sortedcontainers import SortedList
+
+        self.sorted_list = SortedList(pairs)
+
+    def insert(self, pairs):
+        deque(map(self.sorted_list.add, pairs), maxlen=0)
+
+    def pop_min(self, count):
+        pop = self.sorted_list.pop
+        for _ in range(count):
+            pop(0)
+
+    def pop_max(self, count):
+        pop = self.sorted_list.pop
+        for _ in range(count):
+            pop()
+
+    def discard(self, pairs):
+        deque(map(self.sorted_list.discard, pairs), maxlen=0)
+
+    def getitem(self, indexes):
+        deque(map(self.sorted_list.__getitem__, indexes), maxlen=0)
+
+    def irange(self, bounds):
+        sorted_list = self.sorted_list
+        bisect_left = sorted_list.bisect_left
+        for min_key, max_key in bounds:
+            start = bisect_left((min_key,))
+            stop = bisect_left((max_key,))
+            deque(sorted_list.islice(start, stop), maxlen=0)
+
+
+@impl('rbtree')
+class RBTreeImpl:
+    def __init__(self, pairs=()):
+        from bintrees import RBTree  # Works on Python 3.9
+
+        self.tree = RBTree()
+        self.tree.update((pair, None) for pair in pairs)
+
+    def insert(self, pairs):
+        insert = self.tree.insert
+        for pair in pairs:
+            insert(pair, None)
+
+    def pop_min(self, count):
+        pop_min = self.tree.pop_min
+        for _ in range(count):
+            pop_min()
+
+    def pop_max(self, count):
+        pop_max = self.tree.pop_max
+        for _ in range(count):
+            pop_max()
+
+    def discard(self, pairs):
+        deque(map(self.tree.discard, pairs), maxlen=0)
+
+    def irange(self, bounds):
+        iter_items = self.tree.iter_items
+        for min_key, max_key in bounds:
+            deque(iter_items((min_key,), (max_key,)), maxlen=0)
+
+
+@impl('reference')
+class ReferenceImpl:
+    def __init__(self, pairs=()):
+        from prique.reference import Prique
+
+        self.prique = Prique(pairs)
+
+    def insert(self, pairs):
+        deque(starmap(self.prique.add, pairs), maxlen=0)
+
+    def pop_min(self, count):
+        popitem = self.prique.popitem
+        for _ in range(count):
+            popitem(0)
+
+    def pop_max(self, count):
+        popitem = self.prique.popitem
+        for _ in range(count):
+            popitem(-1)
+
+    def discard(self, pairs):
+        deque(starmap(self.prique.discard, pairs), maxlen=0)
+
+    def getitem(self, indexes):
+        deque(map(self.prique.getitem, indexes), maxlen=0)
+
+    def irange(self, bounds):
+        irange = self.prique.irange
+        for min_key, max_key in bounds:
+            deque(irange(min_key, max_key, exc_max=True), maxlen=0)
+
+
+DISTS = ('shuffled', 'ascending', 'descending', 'duplicates', 'tuple', 'str')
+
+
+def make_keys(dist, size, rand):
+    "Return list of keys of size with distribution."
+    if dist == 'shuffled':
+        keys = list(range(size))
+        rand.shuffle(keys)
+    elif dist == 'ascending':
+        keys = list(range(size))
+    elif dist == 'descending':
+        keys = list(range(size, 0, -1))
+    elif dist == 'duplicates':
+        keys = [rand.randrange(size // 100 + 1) for _ in range(size)]
+    elif dist == 'tuple':
+        keys = [(rand.randrange(100), str(index)) for index in range(size)]
+    else:
+        assert dist == 'str'
+        keys = ['%016x' % rand.getrandbits(64) for _ in range(size)]
+
+    return keys
+
+
+# Each operation takes an implementation class, a list of (key, value) pairs
+# and a random generator. It returns the methods the implementation needs, a
+# setup function, a function of the setup result to time, and the count of
+# operations timed.
+
+
+def op_insert(cls, pairs, rand):
+    def run(obj):
+        obj.insert(pairs)
+
+    return ('insert',), cls, run, len(pairs)
+
+
+def op_load(cls, pairs, rand):
+    def run(obj):
+        cls(pairs)
+
+    return (), lambda: None, run, len(pairs)
+
+
+def op_pop_min(cls, pairs, rand):
+    def run(obj):
+        obj.pop_min(len(pairs))
+
+    return ('pop_min',), lambda: cls(pairs), run, len(pairs)
+
+
+def op_pop_max(cls, pairs, rand):
+    def run(obj):
+        obj.pop_max(len(pairs))
+
+    return ('pop_max',), lambda: cls(pairs), run, len(pairs)
+
+
+def op_discard(cls, pairs, rand):
+    shuffled = list(pairs)
+    rand.shuffle(shuffled)
+
+    def run(obj):
+        obj.discard(shuffled)
+
+    return ('discard',), lambda: cls(pairs), run, len(pairs)
+
+
+def op_getitem(cls, pairs, rand):
+    indexes = [rand.randrange(len(pairs)) for _ in range(len(pairs))]
+
+    def run(obj):
+        obj.getitem(indexes)
+
+    return ('getitem',), lambda: cls(pairs), run, len(indexes)
+
+
+def op_irange(cls, pairs, rand):
+    keys = sorted(pair[0] for pair in pairs)
+    bounds = []
+
+    for _ in range(1000):
+        start = rand.randrange(len(keys))
+        stop = min(start + 100, len(keys) - 1)
+        bounds.append((keys[start], keys[stop]))
+
+    def run(obj):
+        obj.irange(bounds)
+
+    return ('irange',), lambda: cls(pairs), run, len(bounds)
+
+
+def op_mixed(cls, pairs, rand):
+    # Queue churn: alternately insert an item and pop the minimum.
+
+    half = len(pairs) >> 1
+    initial = pairs[:half]
+    churn = pairs[half:]
+
+    def run(obj):
+        insert = obj.insert
+        pop_min = obj.pop_min
+        for pair in churn:
+            insert((pair,))
+            pop_min(1)
+
+    return ('insert', 'pop_min'), lambda: cls(initial), run, len(churn) << 1
+
+
+def op_update(cls, pairs, rand):
+    # Batch of a tenth of the items added to a prique of the rest.
+
+    size = len(pairs) // 10
+    initial = pairs[size:]
+    batch = pairs[:size]
+
+    def run(obj):
+        obj.update(batch)
+
+    return ('update',), lambda: cls(initial), run, len(batch)
+
+
+def op_update_add(cls, pairs, rand):
+    # Baseline for update: the same batch inserted item by item.
+
+    size = len(pairs) // 10
+    initial = pairs[size:]
+    batch = pairs[:size]
+
+    def run(obj):
+        obj.insert(batch)
+
+    return ('insert',), lambda: cls(initial), run, len(batch)
+
+
+def op_update_batch(size, add=False):
+    # Fixed size batch added to a prique of the rest, so few items land in
+    # each leaf of a large prique. With add set, the same batch is inserted
+    # item by item as the baseline.
+
+    def op(cls, pairs, rand):
+        count = min(size, len(pairs) >> 1)
+        initial = pairs[count:]
+        batch = pairs[:count]
+
+        def run(obj):
+            if add:
+                obj.insert(batch)
+            else:
+                obj.update(batch)
+
+        method = 'insert' if add else 'update'
+        return (method,), lambda: cls(initial), run, len(batch)
+
+    return op
+
+
+def op_split_join(cls, pairs, rand):
+    keys = [rand.choice(pairs)[0] for _ in range(1000)]
+
+    def run(obj):
+        obj.split_join(keys)
+
+    return ('split_join',), lambda: cls(pairs), run, len(keys)
+
+
+def op_top_k(cls, pairs, rand):
+    def run(obj):
+        obj.top_k(pairs, 1000)
+
+    return ('top_k',), lambda: cls(), run, len(pairs)
+
+
+def op_churn(cls, pairs, rand):
+    # Steady state: insert an item and pop from either end at random.
+
+    half = len(pairs) >> 1
+    initial = pairs[:half]
+    churn = pairs[half:]
+    ends = [rand.random() < 0.5 for _ in churn]
+
+    def run(obj):
+        insert = obj.insert
+        pop_min = obj.pop_min
+        pop_max = obj.pop_max
+        for pair, end in zip(churn, ends):
+            insert((pair,))
+            if end:
+                pop_min(1)
+            else:
+                pop_max(1)
+
+    methods = ('insert', 'pop_min', 'pop_max')
+    return methods, lambda: cls(initial), run, len(churn) << 1
+
+
+OPS = {
+    'insert': op_insert,
+    'load': op_load,
+    'pop_min': op_pop_min,
+    'pop_max': op_pop_max,
+    'discard': op_discard,
+    'getitem': op_getitem,
+    'irange': op_irange,
+    'mixed': op_mixed,
+    'churn': op_churn,
+    'update': op_update,
+    'update_add': op_update_add,
+    'update_1k': op_update_batch(1000),
+    'update_add_1k': op_update_batch(1000, add=True),
+    'update_10k': op_update_batch(10000),
+    'update_add_10k': op_update_batch(10000, add=True),
+    'update_30k': op_update_batch(30000),
+    'update_add_30k': op_update_batch(30000, add=True),
+    'split_join': op_split_join,
+    'top_k': op_top_k,
+}
+
+
+def collections():
+    return sum(stats['collections'] for stats in gc.get_stats())
+
+
+def measure(cls, op, pairs, repeat):
+    """Return mapping of measurements, or None if unsupported.
+
+    Seconds are the best of `repeat` runs. Garbage collections and the change
+    in allocated memory blocks are from the last run.
+
+    """
+    methods, setup, run, count = OPS[op](cls, pairs, random.Random(0))
+
+    if not all(hasattr(cls, method) for method in methods):
+        return None
+
+    times = []
+
+    for _ in range(repeat):
+        obj = setup()
+        gc.collect()
+        gc_start = collections()
+        blocks_start = sys.getallocatedblocks()
+        start = time.perf_counter()
+        run(obj)
+        times.append(time.perf_counter() - start)
+        blocks = sys.getallocatedblocks() - blocks_start
+        gc_count = collections() - gc_start
+
+    return {
+        'seconds': min(times),
+        'count': count,
+        'gc_collections': gc_count,
+        'allocated_blocks': blocks,
+    }
+
+
+def memory(cls, pairs):
+    "Return bytes per item traced while loading pairs."
+    tracemalloc.start()
+    obj = cls(pairs)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del obj
+    return size / len(pairs)
+
+
+def available(names):
+    "Return mapping of names to implementations that construct."
+    impls = {}
+
+    for name in names:
+        cls = IMPLS[name]
+
+        try:
+            cls([(0, 0)])
+        except Exception as exc:
+            print('skip %s: %r' % (name, exc), file=sys.stderr)
+        else:
+            impls[name] = cls
+
+    return impls
+
+
+def run(args):
+    impls = available(args.impls)
+    results = []
+
+    for size in args.sizes:
+        for dist in args.dists:
+            keys = make_keys(dist, size, random.Random(0))
+            pairs = list(zip(keys, range(size)))
+
+            for name, cls in impls.items():
+                for op in args.ops:
+                    measured = measure(cls, op, pairs, args.repeat)
+
+                    if measured is None:
+                        continue
+
+                    result = {'impl': name, 'op': op, 'dist': dist, 'size': size}
+                    result.update(measured)
+                    result['ns_per_op'] = (
+                        measured['seconds'] / measured['count'] * 1e9
+                    )
+                    line = '%-10s %-14s %-10s %10d %12.1f ns/op %6d gc' % (
+                        name, op, dist, size, result['ns_per_op'],
+                        result['gc_collections'],
+                    )
+
+                    if args.memory and op == 'load':
+                        result['bytes_per_item'] = memory(cls, pairs)
+                        line += ' %8.1f bytes/item' % result['bytes_per_item']
+
+                    results.append(result)
+                    print(line)
+
+    if args.output:
+        document = {
+            'meta': {
+                'date': datetime.datetime.now().isoformat(),
+                'python': sys.version,
+                'platform': platform.platform(),
+                'core': core.__file__,
+                'argv': sys.argv[1:],
+            },
+            'results': results,
+        }
+
+        with open(args.output, 'w') as writer:
+            json.dump(document, writer, indent=2)
+
+    return 0
+
+
+def compare(args):
+    def load(path):
+        with open(path) as reader:
+            document = json.load(reader)
+
+        return {
+            (result['impl'], result['op'], result['dist'], result['size']):
+            result['ns_per_op']
+            for result in document['results']
+        }
+
+    base = load(args.base)
+    head = load(args.head)
+    regressions = 0
+
+    for key in sorted(base.keys() & head.keys(), key=str):
+        ratio = head[key] / base[key]
+
+        if ratio > 1 + args.threshold:
+            flag = 'REGRESSION'
+            regressions += 1
+        elif ratio < 1 - args.threshold:
+            flag = 'improved'
+        else:
+            flag = ''
+
+        print('%-10s %-14s %-10s %10d %8.2fx %s' % (key + (ratio, flag)))
+
+    print('%d regressions' % regressions)
+    return 1 if regressions else 0
+
+
+def names(choices):
+    def parse(text):
+        values = text.split(',')
+
+        for value in values:
+            if value not in choices:
+                raise argparse.ArgumentTypeError('unknown: %r' % value)
+
+        return values
+
+    return parse
+
+
+def sizes(text):
+    return [int(float(size)) for size in text.split(',')]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Prique benchmark')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    parser_run = commands.add_parser('run', help='run benchmarks')
+    parser_run.add_argument('--sizes', type=sizes, default='1e3,1e4,1e5')
+    parser_run.add_argument(
+        '--dists', type=names(DISTS), default=','.join(DISTS)
+    )
+    parser_run.add_argument('--ops', type=names(OPS), default=','.join(OPS))
+    parser_run.add_argument(
+        '--impls', type=names(IMPLS), default=','.join(IMPLS)
+    )
+    parser_run.add_argument('--repeat', type=int, default=3)
+    parser_run.add_argument(
+        '--memory', action='store_true', help='trace bytes per item on load'
+    )
+    parser_run.add_argument('--output', help='path to write JSON results')
+
+    parser_compare = commands.add_parser(
+        'compare', help='compare JSON results and flag regressions'
+    )
+    parser_compare.add_argument('base')
+    parser_compare.add_argument('head')
+    parser_compare.add_argument(
+        '--threshold',
+        type=float,
+        default=0.1,
+        help='relative slowdown flagged as regression (default 0.1)',
+    )
+
+    args = parser.parse_args(argv)
+    command = run if args.command == 'run' else compare
+    return command(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+import queue
+import random
+import threading
+import time
+
+from prique import core
+from prique.queue import PriorityQueue
+
+print(core.__file__)
+rand = random.Random(0)
+PRODUCERS = 4
+CONSUMERS = 4
+ITEMS = 200_000
+BATCH = 1_000
+keys = [rand.randrange(1_000_000) for _ in range(ITEMS)]
+
+
+def run(make, put, get):
+    q = make()
+    share = ITEMS // PRODUCERS
+
+    def produce(start):
+        put(q, keys[start:start + share])
+
+    consumed = [0]
+    lock = threading.Lock()
+
+    def consume():
+        while True:
+            with lock:
+                if consumed[0] >= ITEMS:
+                    return
+            try:
+                count = get(q)
+            except queue.Empty:
+                continue
+            with lock:
+                consumed[0] += count
+
+    threads = [
+        threading.Thread(target=produce, args=(index * share,))
+        for index in range(PRODUCERS)
+    ]
+    threads += [threading.Thread(target=consume) for _ in range(CONSUMERS)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return ITEMS / (time.perf_counter() - start)
+
+
+def stdlib_put(q, batch):
+    for key in batch:
+        q.put((key, key))
+
+
+def stdlib_get(q):
+    q.get(timeout=0.01)
+    return 1
+
+
+def prique_put(q, batch):
+    for key in batch:
+        q.put(key, key)
+
+
+def prique_get(q):
+    q.get(timeout=0.01)
+    return 1
+
+
+def prique_put_many(q, batch):
+    for start in range(0, len(batch), BATCH):
+        q.put_many((key, key) for key in batch[start:start + BATCH])
+
+
+def prique_get_many(q):
+    return len(q.get_many(BATCH, timeout=0.01))
+
+
+for name, make, put, get in [
+    ('queue.PriorityQueue', queue.PriorityQueue, stdlib_put, stdlib_get),
+    ('prique PriorityQueue', PriorityQueue, prique_put, prique_get),
+    ('prique PriorityQueue batch', PriorityQueue, prique_put_many,
+     prique_get_many),
+]:
+    rates = [run(make, put, get) for _ in range(3)]
+    print(f'{name}: {max(rates):,.0f} items/s')
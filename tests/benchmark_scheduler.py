@@ -0,0 +1,52 @@
+import heapq
+import random
+import time
+
+from prique import core
+from prique.scheduler import Scheduler
+
+print(core.__file__)
+rand = random.Random(0)
+TIMERS = 1_000_000
+TICKS = 100
+times = [rand.random() * TICKS for _ in range(TIMERS)]
+
+
+def run_heapq():
+    heap = [(when, index) for index, when in enumerate(times)]
+    heapq.heapify(heap)
+    start = time.perf_counter()
+    for now in range(1, TICKS + 1):
+        while heap and heap[0][0] <= now:
+            heapq.heappop(heap)
+    return time.perf_counter() - start
+
+
+def run_popitem():
+    s = Scheduler()
+    for index, when in enumerate(times):
+        s.schedule(when, index)
+    prique = s._prique  # Per-item baseline.
+    start = time.perf_counter()
+    for now in range(1, TICKS + 1):
+        while prique.len() and prique.peekitem(0)[0] <= now:
+            prique.popitem(0)
+    return time.perf_counter() - start
+
+
+def run_pop_due():
+    s = Scheduler()
+    for index, when in enumerate(times):
+        s.schedule(when, index)
+    start = time.perf_counter()
+    for now in range(1, TICKS + 1):
+        s.pop_due(now)
+    return time.perf_counter() - start
+
+
+for name, func in [
+    ('heapq.heappop', run_heapq),
+    ('Prique.popitem', run_popitem),
+    ('Scheduler.pop_due', run_pop_due),
+]:
+    print(f'{name}: {TIMERS / func():,.0f} timers/s')
@@ -0,0 +1,275 @@
+import asyncio
+import random
+
+import pytest
+
+from prique.aioqueue import PriorityQueue, QueueEmpty, QueueFull
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_put_get():
+    async def main():
+        q = PriorityQueue()
+        rand = random.Random(0)
+        keys = [rand.randrange(100) for _ in range(1000)]
+        for index, key in enumerate(keys):
+            await q.put(key, index)
+        assert q.qsize() == 1000
+        assert [(await q.get())[0] for _ in range(1000)] == sorted(keys)
+        assert q.empty()
+
+    run(main())
+
+
+def test_get_empty():
+    q = PriorityQueue()
+    with pytest.raises(QueueEmpty):
+        q.get_nowait()
+    with pytest.raises(QueueEmpty):
+        q.peek()
+    assert run(q.get_batch(10, timeout=0.01)) == []
+
+
+def test_maxsize():
+    async def main():
+        q = PriorityQueue(maxsize=2)
+        await q.put(1, 'a')
+        q.put_nowait(0, 'b')
+        assert q.full()
+        with pytest.raises(QueueFull):
+            q.put_nowait(2, 'c')
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(q.put(2, 'c'), 0.01)
+        assert q.qsize() == 2
+        assert q.peek() == (0, 'b')
+        assert await q.get() == (0, 'b')
+        with pytest.raises(ValueError):
+            PriorityQueue(maxlen=2)
+        with pytest.raises(ValueError):
+            PriorityQueue(key=lambda value: value['p'])
+
+    run(main())
+
+
+def test_put_many_get_batch():
+    async def main():
+        q = PriorityQueue()
+        await q.put_many((index % 10, index) for index in range(100))
+        items = await q.get_batch(30)
+        assert [key for key, _ in items] == [0] * 10 + [1] * 10 + [2] * 10
+        assert len(await q.get_batch(1000)) == 70
+
+    run(main())
+
+
+def test_stable():
+    async def main():
+        q = PriorityQueue(stable=True, handles=True)
+        for index in range(30):
+            await q.put(index % 3, index)
+        await q.put_many((index % 3, index) for index in range(30, 60))
+        handle = q.put_nowait(5, 'x')
+        q.change(handle, 1)
+        items = await q.get_batch(100)
+        assert items == (
+            [(0, index) for index in range(0, 60, 3)]
+            + [(1, index) for index in range(1, 60, 3)]
+            + [(1, 'x')]
+            + [(2, index) for index in range(2, 60, 3)]
+        )
+
+    run(main())
+
+
+def test_put_many_tie_order():
+    async def main():
+        q = PriorityQueue()
+        await q.put_many((index % 3, index) for index in range(30))
+        for index in range(30, 60):
+            await q.put(index % 3, index)
+        items = await q.get_batch(100)
+        assert items == (
+            [(0, index) for index in range(57, -1, -3)]
+            + [(1, index) for index in range(58, 0, -3)]
+            + [(2, index) for index in range(59, 1, -3)]
+        )
+
+    run(main())
+
+
+def test_put_many_bounded():
+    async def main():
+        q = PriorityQueue(maxsize=10)
+        results = []
+
+        async def consume():
+            while len(results) < 100:
+                results.extend(await q.get_batch(7))
+
+        task = asyncio.ensure_future(consume())
+        await q.put_many((index, index) for index in range(100))
+        await task
+        assert sorted(results) == [(index, index) for index in range(100)]
+
+    run(main())
+
+
+def test_get_waiters():
+    async def main():
+        q = PriorityQueue()
+        tasks = [asyncio.ensure_future(q.get()) for _ in range(5)]
+        await asyncio.sleep(0)
+        await q.put_many((index, index) for index in range(5))
+        results = await asyncio.gather(*tasks)
+        assert sorted(results) == [(index, index) for index in range(5)]
+
+    run(main())
+
+
+def test_get_wakeups():
+    async def main():
+        q = PriorityQueue()
+        tasks = [asyncio.ensure_future(q.get()) for _ in range(100)]
+        await asyncio.sleep(0)
+        await q.put_many((index, index) for index in range(10))
+        assert len(q._getters) == 90
+        await asyncio.sleep(0)
+        assert len(q._getters) == 90
+        assert sum(task.done() for task in tasks) == 10
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        tasks = [asyncio.ensure_future(q.get_batch(100)) for _ in range(100)]
+        await asyncio.sleep(0)
+        await q.put_many((index, index) for index in range(50))
+        assert len(q._getters) == 99
+        await asyncio.sleep(0)
+        assert len(q._getters) == 99
+        assert [len(task.result()) for task in tasks if task.done()] == [50]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    run(main())
+
+
+def test_get_cancel():
+    async def main():
+        q = PriorityQueue()
+        task = asyncio.ensure_future(q.get())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await q.put(0, 'a')
+        assert await asyncio.wait_for(q.get(), 1) == (0, 'a')
+
+    run(main())
+
+
+def test_get_batch_cancel():
+    async def main():
+        q = PriorityQueue()
+        first = asyncio.ensure_future(q.get_batch(10))
+        second = asyncio.ensure_future(q.get_batch(10))
+        await asyncio.sleep(0)
+        q.put_nowait(0, 'a')
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        assert await asyncio.wait_for(second, 1) == [(0, 'a')]
+
+    run(main())
+
+
+def test_put_many_cancel():
+    async def main():
+        q = PriorityQueue(maxsize=1)
+        q.put_nowait(0, 'a')
+        first = asyncio.ensure_future(q.put_many([(1, 'b')]))
+        second = asyncio.ensure_future(q.put_many([(2, 'c')]))
+        await asyncio.sleep(0)
+        q.get_nowait()
+        first.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+        await asyncio.wait_for(second, 1)
+        assert q.get_nowait() == (2, 'c')
+
+    run(main())
+
+
+def test_get_due():
+    async def main():
+        loop = asyncio.get_running_loop()
+        q = PriorityQueue()
+        now = loop.time()
+        await q.put(now + 10, 'late')
+        await q.put(now - 1, 'past')
+        assert await q.get_due(10) == [(now - 1, 'past')]
+        task = asyncio.ensure_future(q.get_due())
+        await asyncio.sleep(0)
+        assert not task.done()
+        await q.put(loop.time() + 0.01, 'soon')
+        (_, value), = await asyncio.wait_for(task, 1)
+        assert value == 'soon'
+        assert q.qsize() == 1
+
+    run(main())
+
+
+def test_get_due_empty():
+    async def main():
+        loop = asyncio.get_running_loop()
+        q = PriorityQueue()
+        task = asyncio.ensure_future(q.get_due())
+        await asyncio.sleep(0)
+        await q.put(loop.time(), 'now')
+        (_, value), = await asyncio.wait_for(task, 1)
+        assert value == 'now'
+
+    run(main())
+
+
+def test_task_done_join():
+    async def main():
+        q = PriorityQueue()
+        for index in range(10):
+            q.put_nowait(index, index)
+
+        async def work():
+            while True:
+                try:
+                    q.get_nowait()
+                except QueueEmpty:
+                    return
+                q.task_done()
+                await asyncio.sleep(0)
+
+        tasks = [asyncio.ensure_future(work()) for _ in range(4)]
+        await q.join()
+        await asyncio.gather(*tasks)
+        with pytest.raises(ValueError):
+            q.task_done()
+
+    run(main())
+
+
+def test_cancel_change():
+    async def main():
+        q = PriorityQueue(handles=True)
+        handles = [await q.put(index, index) for index in range(10)]
+        assert q.cancel(handles[0]) == (0, 0)
+        q.change(handles[9], -1)
+        assert await q.get() == (-1, 9)
+        assert q.irange(3, 5) == [(3, 3), (4, 4), (5, 5)]
+        assert q.qsize() == 8
+        await q.get_batch(8)
+        with pytest.raises(ValueError):
+            q.change(handles[9], 0)
+
+    run(main())
@@ -0,0 +1,32 @@
+import random
+
+import pytest
+
+from prique.autotune import autotune, measure
+
+
+def test_measure():
+    items = [(index, index) for index in range(1000)]
+    timings = measure(items, 16)
+    assert set(timings) == {'insert', 'range', 'pop'}
+    assert all(value >= 0 for value in timings.values())
+
+
+def test_autotune():
+    rand = random.Random(0)
+    items = [(rand.random(), index) for index in range(1000)]
+    best, results = autotune(items, loads=(8, 32), repeat=1)
+    assert best in (8, 32)
+    assert set(results) == {8, 32}
+
+
+def test_autotune_weights():
+    items = [(index, index) for index in range(1000)]
+    weights = {'pop': 1}
+    best, results = autotune(items, loads=(8, 32), weights=weights, repeat=1)
+    assert best == min(results, key=lambda load: results[load]['pop'])
+
+
+def test_autotune_empty():
+    with pytest.raises(ValueError):
+        autotune([])
@@ -1,8 +1,12 @@
+import bisect
 import collections
 import itertools
 import random
 import string
 
+import pytest
+
+from prique import core
 from prique.core import Prique
 
 
@@ -78,3 +82,924 @@ def test_add_new_max():
         p.add_left(81, 'b')
         p.check()
     assert p.len() == 200
+
+
+def test_discard():
+    p = Prique()
+    p.init()
+    p.add_left(4, 'd')
+    assert not p.discard(4, 'e')
+    assert not p.discard(5, 'd')
+    assert p.discard(4, 'd')
+    assert p.check() == 0
+    assert p.len() == 0
+    assert not p.discard(4, 'd')
+
+
+def test_discard_inc():
+    p = Prique()
+    p.init()
+    for index in range(1000):
+        p.add_left(index, str(index))
+    for index in range(1000):
+        assert p.discard(index, str(index))
+        assert p.check() == 0
+    assert p.len() == 0
+
+
+def test_discard_dec():
+    p = Prique()
+    p.init()
+    for index in range(1000):
+        p.add_left(index, str(index))
+    for index in reversed(range(1000)):
+        assert p.discard(index, str(index))
+        assert p.check() == 0
+    assert p.len() == 0
+
+
+def test_discard_rand():
+    p = Prique()
+    p.init()
+    rand = random.Random(0)
+    items = [(rand.randrange(100), index) for index in range(10000)]
+    for key, value in items:
+        p.add_left(key, value)
+    rand.shuffle(items)
+    for count, (key, value) in enumerate(items):
+        assert p.discard(key, value)
+        if count % 100 == 0:
+            assert p.check() == 0
+    assert p.check() == 0
+    assert p.len() == 0
+
+
+def test_discard_same():
+    p = Prique()
+    p.init()
+    for index in range(1000):
+        p.add_left(0, index)
+    for index in range(0, 1000, 2):
+        assert p.discard(0, index)
+        assert p.check() == 0
+    assert p.len() == 500
+
+
+def test_discard_churn():
+    p = Prique()
+    p.init()
+    rand = random.Random(0)
+    items = []
+    for index in range(20000):
+        if items and rand.random() < 0.5:
+            key, value = items.pop(rand.randrange(len(items)))
+            assert p.discard(key, value)
+        else:
+            key = rand.randrange(1000)
+            items.append((key, index))
+            p.add_left(key, index)
+    assert p.check() == 0
+    assert p.len() == len(items)
+
+
+def test_peekitem():
+    p = Prique()
+    p.init()
+    with pytest.raises(IndexError):
+        p.peekitem()
+    for index in range(1000):
+        p.add_left(index, str(index))
+        assert p.peekitem(0) == (0, '0')
+        assert p.peekitem(-1) == (index, str(index))
+        assert p.peekitem() == (index, str(index))
+
+
+def test_popitem():
+    p = Prique()
+    p.init()
+    rand = random.Random(0)
+    items = [(rand.randrange(1000), index) for index in range(10000)]
+    for key, value in items:
+        p.add_left(key, value)
+    keys = sorted(key for key, _ in items)
+    while keys:
+        if rand.random() < 0.5:
+            key, value = p.popitem(0)
+            assert key == keys.pop(0)
+        else:
+            key, value = p.popitem()
+            assert key == keys.pop()
+        if len(keys) % 100 == 0:
+            assert p.check() == 0
+    assert p.len() == 0
+    with pytest.raises(IndexError):
+        p.popitem()
+
+
+def test_popitem_order():
+    p = Prique()
+    p.init()
+    rand = random.Random(0)
+    items = list(zip(range(1000), range(1000)))
+    rand.shuffle(items)
+    for key, value in items:
+        p.add_left(key, value)
+    assert [p.popitem(0) for _ in range(500)] == sorted(items)[:500]
+    assert [p.popitem(-1) for _ in range(500)] == sorted(items)[:499:-1]
+    assert p.check() == 0
+
+
+def test_getitem():
+    p = Prique()
+    p.init()
+    rand = random.Random(0)
+    items = [(rand.randrange(1000), index) for index in range(10000)]
+    for key, value in items:
+        p.add_left(key, value)
+    keys = sorted(key for key, _ in items)
+    for index in range(-len(keys), len(keys)):
+        assert p.getitem(index)[0] == keys[index]
+    for index in (len(keys), -len(keys) - 1):
+        with pytest.raises(IndexError):
+            p.getitem(index)
+    assert p.peekitem(100) == p.getitem(100)
+
+
+def test_delitem():
+    p = Prique()
+    p.init()
+    rand = random.Random(0)
+    for index in range(10000):
+        p.add_left(index, index)
+    keys = list(range(10000))
+    while keys:
+        index = rand.randrange(-len(keys), len(keys))
+        del keys[index]
+        p.delitem(index)
+        if len(keys) % 100 == 0:
+            assert p.check() == 0
+    assert p.len() == 0
+    with pytest.raises(IndexError):
+        p.delitem(0)
+
+
+def test_popitem_index():
+    p = Prique()
+    p.init()
+    rand = random.Random(0)
+    for index in range(1000):
+        p.add_left(index, str(index))
+    keys = list(range(1000))
+    while keys:
+        index = rand.randrange(len(keys))
+        key = keys.pop(index)
+        assert p.popitem(index) == (key, str(key))
+    assert p.check() == 0
+
+
+def test_init_items():
+    rand = random.Random(0)
+    for size in [0, 1, 19, 20, 21, 40, 41, 1000, 12345]:
+        items = [(rand.randrange(100), index) for index in range(size)]
+        p = Prique()
+        p.init(items)
+        assert p.check() == 0
+        assert p.len() == size
+        expected = sorted(items[::-1], key=lambda item: item[0])
+        assert [p.getitem(index) for index in range(size)] == expected
+
+
+def test_init_items_modify():
+    rand = random.Random(0)
+    items = [(index, index) for index in range(10000)]
+    p = Prique()
+    p.init(items)
+    rand.shuffle(items)
+    for key, value in items[:5000]:
+        assert p.discard(key, value)
+    for key, value in items[:5000]:
+        p.add_left(key, value)
+    assert p.check() == 0
+    assert p.len() == 10000
+
+
+def test_update():
+    rand = random.Random(0)
+    p = Prique()
+    p.init()
+    items = []
+    for size in [0, 1, 10, 100, 1000, 10, 5000, 3, 20000, 100]:
+        batch = [(rand.randrange(1000), rand.random()) for _ in range(size)]
+        p.update(batch)
+        items.extend(batch)
+        assert p.check() == 0
+        assert p.len() == len(items)
+    keys = sorted(key for key, _ in items)
+    assert [p.getitem(index)[0] for index in range(len(keys))] == keys
+    for key, value in items:
+        assert p.discard(key, value)
+    assert p.check() == 0
+
+
+def test_update_sorted():
+    p = Prique()
+    p.init((index, index) for index in range(0, 100000, 10))
+    p.update((index, index) for index in range(5, 100000, 10))
+    p.update([(-1, -1), (100000, 100000)])
+    assert p.check() == 0
+    assert p.len() == 20002
+    assert p.peekitem(0) == (-1, -1)
+    assert p.peekitem(-1) == (100000, 100000)
+
+
+def test_update_same():
+    p = Prique()
+    p.init((0, index) for index in range(1000))
+    p.update((0, index) for index in range(1000, 1100))
+    p.update((1, index) for index in range(100))
+    assert p.check() == 0
+    assert p.len() == 1200
+    assert p.getitem(0) == (0, 1099)
+
+
+def test_update_tie_order():
+    rand = random.Random(0)
+    for size in (10, 1000):
+        for maxlen in (0, 500):
+            items = [(rand.randrange(10), index) for index in range(1000)]
+            batch = [(rand.randrange(10), index) for index in range(size)]
+            p = Prique()
+            p.init(items, maxlen=maxlen)
+            q = Prique()
+            q.init(items, maxlen=maxlen)
+            p.update(batch)
+            for key, value in batch:
+                q.add_left(key, value)
+            assert p.check() == 0
+            assert list(p) == list(q)
+            r = Prique()
+            r.init(maxlen=maxlen)
+            for key, value in items:
+                r.add_left(key, value)
+            p = Prique()
+            p.init(items, maxlen=maxlen)
+            assert list(p) == list(r)
+
+
+def test_iter():
+    rand = random.Random(0)
+    items = [(rand.randrange(100), index) for index in range(5000)]
+    p = Prique()
+    p.init(items)
+    expected = sorted(items[::-1], key=lambda item: item[0])
+    assert list(p) == expected
+    assert list(reversed(p)) == expected[::-1]
+    p = Prique()
+    p.init()
+    assert list(p) == []
+    assert list(reversed(p)) == []
+
+
+def test_islice():
+    rand = random.Random(0)
+    items = [(index, str(index)) for index in range(1000)]
+    p = Prique()
+    p.init(items)
+    bounds = [None, -2000, -1000, -500, -1, 0, 1, 20, 21, 500, 999, 1000, 2000]
+    for start in bounds:
+        for stop in bounds:
+            expected = items[start:stop]
+            assert list(p.islice(start, stop)) == expected
+            assert list(p.islice(start, stop, True)) == expected[::-1]
+
+
+def test_irange():
+    rand = random.Random(0)
+    items = [(rand.randrange(0, 100, 2), index) for index in range(2000)]
+    p = Prique()
+    p.init(items)
+    items.reverse()
+    items.sort(key=lambda item: item[0])
+    bounds = [None, -1, 0, 1, 2, 49, 50, 51, 98, 99, 100]
+    for min_key in bounds:
+        for max_key in bounds:
+            for exc_min in (False, True):
+                for exc_max in (False, True):
+                    expected = [
+                        (key, value)
+                        for key, value in items
+                        if (
+                            min_key is None
+                            or (key > min_key if exc_min else key >= min_key)
+                        )
+                        and (
+                            max_key is None
+                            or (key < max_key if exc_max else key <= max_key)
+                        )
+                    ]
+                    args = min_key, max_key, exc_min, exc_max
+                    assert list(p.irange(*args)) == expected
+                    assert list(p.irange(*args, True)) == expected[::-1]
+
+
+def test_init_load():
+    rand = random.Random(0)
+    for load in [4, 5, 7, 8, 13, 64, 1000]:
+        p = Prique()
+        p.init(load=load)
+        items = [(rand.randrange(1000), index) for index in range(5000)]
+        for key, value in items:
+            p.add_left(key, value)
+        assert p.check() == 0
+        rand.shuffle(items)
+        for key, value in items[:4000]:
+            assert p.discard(key, value)
+        assert p.check() == 0
+        p.update(items[:100])
+        assert p.check() == 0
+        assert p.len() == 1100
+    with pytest.raises(ValueError):
+        p.init(load=3)
+
+
+def test_handles():
+    p = Prique()
+    p.init(handles=True)
+    rand = random.Random(0)
+    handles = {}
+    for index in range(5000):
+        key = rand.randrange(10)
+        handles[index] = (key, p.add_left(key, index))
+    assert p.check() == 0
+    for index in rand.sample(range(5000), 2000):
+        key, handle = handles.pop(index)
+        assert p.remove(handle) == (key, index)
+        with pytest.raises(ValueError):
+            p.remove(handle)
+    assert p.check() == 0
+    for index in rand.sample(sorted(handles), 2000):
+        key, handle = handles[index]
+        new_key = rand.randrange(10)
+        assert p.change(handle, new_key) is handle
+        handles[index] = (new_key, handle)
+    assert p.check() == 0
+    assert sorted(p) == sorted((key, index) for index, (key, _) in handles.items())
+
+
+def test_handles_modify():
+    p = Prique()
+    p.init([(index, index) for index in range(1000)], handles=True)
+    rand = random.Random(0)
+    handles = [(p.add_left(index, -index), index) for index in range(1000)]
+    p.update((rand.randrange(1000), None) for _ in range(100))
+    p.update((rand.randrange(1000), None) for _ in range(3000))
+    assert p.check() == 0
+    for _ in range(2000):
+        p.popitem(rand.choice([0, -1]))
+    p.delitem(100)
+    assert p.check() == 0
+    for handle, index in handles:
+        if handle._leaf is not None:
+            assert p.remove(handle) == (index, -index)
+    assert p.check() == 0
+    assert all(value is None or value >= 0 for _, value in p)
+
+
+def test_handles_none():
+    p = Prique()
+    p.init()
+    assert p.add_left(0, 'a') is None
+
+
+def test_handles_type():
+    p = Prique()
+    p.init(handles=True)
+    p.add_left(0, 'a')
+    for handle in (None, 'a'):
+        with pytest.raises(TypeError):
+            p.remove(handle)
+        with pytest.raises(TypeError):
+            p.change(handle, 1)
+    assert p.len() == 1
+
+
+def test_contains_count_index():
+    for indexed in (False, True):
+        p = Prique()
+        items = [(index % 10, index) for index in range(1000)]
+        p.init(items, indexed=indexed)
+        for key, value in items:
+            assert p.contains(key, value)
+            assert p.count(key, value) == 1
+            assert p.getitem(p.index(key, value)) == (key, value)
+        assert not p.contains(1, 0)
+        assert p.count(1, 0) == 0
+        with pytest.raises(ValueError):
+            p.index(1, 0)
+    p = Prique()
+    p.init([(0, 'a')] * 100 + [(0, 'b')] * 100)
+    assert p.count(0, 'a') == 100
+    assert p.count(0, 'b') == 100
+    assert p.index(0, 'a') == 100
+
+
+def test_indexed():
+    p = Prique()
+    p.init(indexed=True)
+    rand = random.Random(0)
+    items = [(rand.randrange(10), index) for index in range(5000)]
+    for key, value in items:
+        p.add_left(key, value)
+    with pytest.raises(ValueError):
+        p.add_left(0, 0)
+    assert p.check() == 0
+    rand.shuffle(items)
+    for key, value in items[:2000]:
+        assert not p.discard(key + 1, value)
+        assert p.discard(key, value)
+        assert not p.contains(key, value)
+    assert p.check() == 0
+    p.update((rand.randrange(10), -index) for index in range(1, 100))
+    p.update((rand.randrange(10), -index) for index in range(100, 5000))
+    with pytest.raises(ValueError):
+        p.update([(0, -1)])
+    with pytest.raises(ValueError):
+        p.update([(0, 'x'), (1, 'x')])
+    assert p.check() == 0
+    for _ in range(1000):
+        p.popitem(rand.choice([0, -1]))
+    assert p.check() == 0
+    with pytest.raises(ValueError):
+        p.init([(0, 'a'), (1, 'a')], indexed=True)
+
+
+def test_indexed_handles():
+    p = Prique()
+    p.init(handles=True, indexed=True)
+    handles = [p.add_left(index % 7, index) for index in range(1000)]
+    for index, handle in enumerate(handles[::3]):
+        p.change(handle, -index)
+    for handle in handles[1::3]:
+        p.remove(handle)
+    assert p.check() == 0
+    assert p.peekitem(0)[0] == -333
+
+
+def test_popto():
+    for handles, indexed in itertools.product((False, True), repeat=2):
+        p = Prique()
+        rand = random.Random(0)
+        items = [(rand.randrange(1000), index) for index in range(5000)]
+        p.init(items, handles=handles, indexed=indexed)
+        items.reverse()
+        items.sort(key=lambda item: item[0])
+        assert p.popto(-1) == []
+        for max_key in (0, 10, 11, 300, 301, 990):
+            exc_max = max_key % 2 == 1
+            count = sum(
+                1 for key, _ in items
+                if key < max_key or (key == max_key and not exc_max)
+            )
+            assert p.popto(max_key, exc_max) == items[:count]
+            del items[:count]
+            assert p.check() == 0
+            assert list(p) == items
+        assert p.popto(1000) == items
+        assert p.len() == 0
+        assert p.check() == 0
+
+
+def test_popto_churn():
+    p = Prique()
+    p.init(load=8, handles=True)
+    rand = random.Random(0)
+    handles = {}
+    now = 0
+    for _ in range(200):
+        for _ in range(rand.randrange(50)):
+            key = now + rand.randrange(100)
+            handles[p.add_left(key, key)] = key
+        now += rand.randrange(20)
+        for key, _ in p.popto(now):
+            assert key <= now
+        assert p.check() == 0
+        assert p.len() == 0 or p.peekitem(0)[0] > now
+        for handle in list(handles):
+            if handles[handle] <= now:
+                with pytest.raises(ValueError):
+                    p.remove(handle)
+                del handles[handle]
+    for handle in handles:
+        p.remove(handle)
+    assert p.len() == 0
+
+
+def test_maxlen():
+    for handles, indexed in itertools.product((False, True), repeat=2):
+        p = Prique()
+        rand = random.Random(0)
+        items = [(rand.randrange(1000), index) for index in range(5000)]
+        p.init(items[:50], load=8, handles=handles, indexed=indexed, maxlen=100)
+        assert p.len() == 50
+        kept = {}
+        for key, value in items[50:3000]:
+            handle = p.add_left(key, value)
+            if handles and handle is not None:
+                kept[handle] = key
+        p.update(items[3000:3010])
+        p.update(items[3010:])
+        assert p.check() == 0
+        assert p.len() == 100
+        assert [key for key, _ in p] == sorted(key for key, _ in items)[:100]
+        for handle in kept:
+            if handle._leaf is not None:
+                p.remove(handle)
+        assert p.check() == 0
+    p = Prique()
+    p.init(((index, index) for index in range(10)), maxlen=5)
+    assert list(p) == [(index, index) for index in range(5)]
+    assert p.add_left(5, 'x') is None
+    p.add_left(4, 'y')
+    assert list(p)[-2:] == [(3, 3), (4, 'y')]
+    with pytest.raises(ValueError):
+        p.init(maxlen=-1)
+
+
+def test_split_join():
+    rand = random.Random(0)
+    for handles, indexed in itertools.product((False, True), repeat=2):
+        for size in (0, 1, 100, 3000):
+            items = [(rand.randrange(size or 1), index) for index in range(size)]
+            keys = sorted(key for key, _ in items)
+            for key in (-1, 0, size // 3, size - 1, size):
+                p = Prique()
+                p.init(items, load=8, handles=handles, indexed=indexed)
+                q = p.split(key)
+                assert p.check() == 0
+                assert q.check() == 0
+                assert [key for key, _ in p] == keys[:p.len()]
+                assert [key for key, _ in q] == keys[p.len():]
+                assert all(other < key for other, _ in p)
+                assert all(other >= key for other, _ in q)
+                if rand.random() < 0.5:
+                    p.join(q)
+                else:
+                    q.join(p)
+                    p, q = q, p
+                assert p.check() == 0
+                assert q.check() == 0
+                assert q.len() == 0
+                assert [key for key, _ in p] == keys
+
+
+def test_split_join_churn():
+    p = Prique()
+    p.init(((index, index) for index in range(10000)), load=8, handles=True)
+    handles = [p.add_left(index, index) for index in range(100)]
+    rand = random.Random(0)
+    for _ in range(200):
+        split = rand.randrange(10000)
+        q = p.split(split)
+        for _ in range(rand.randrange(100)):
+            key = rand.randrange(10000)
+            (p if key < split else q).add_left(key, -1)
+        if rand.random() < 0.5:
+            p.join(q)
+        else:
+            q.join(p)
+            p = q
+    assert p.check() == 0
+    for handle in handles:
+        p.remove(handle)
+    assert p.check() == 0
+
+
+def test_split_join_leaf_size():
+    rand = random.Random(0)
+    for options in ({'handles': True}, {'indexed': True}):
+        p = Prique()
+        p.init([(index, index) for index in range(5000)], load=16, **options)
+        for _ in range(2000):
+            p.join(p.split(rand.randrange(5000)))
+        assert p.check() == 0
+        assert list(p) == [(index, index) for index in range(5000)]
+        assert min(p.stats()['fill']) >= 4
+
+
+def test_delete_range_leaf_size():
+    rand = random.Random(0)
+    for options in ({'handles': True}, {'indexed': True}):
+        p = Prique()
+        p.init([(index, index) for index in range(5000)], load=16, **options)
+        for index in range(2000):
+            key = rand.randrange(5000)
+            assert p.delete_range(key, key) == 1
+            p.add_left(key, (key, index))
+        assert p.check() == 0
+        assert [key for key, _ in p] == list(range(5000))
+        assert min(p.stats()['fill']) >= 4
+
+
+def test_bisect():
+    rand = random.Random(0)
+    items = [(rand.randrange(100), index) for index in range(1000)]
+    keys = sorted(key for key, _ in items)
+    p = Prique()
+    p.init(items, load=8)
+    for key in range(-1, 102):
+        assert p.bisect_left(key) == bisect.bisect_left(keys, key)
+        assert p.bisect_right(key) == bisect.bisect_right(keys, key)
+
+
+def test_count_range():
+    rand = random.Random(0)
+    items = [(rand.randrange(100), index) for index in range(1000)]
+    p = Prique()
+    p.init(items, load=8)
+    bounds = (None, -1, 0, 10, 50, 99, 100)
+    for min_key, max_key in itertools.product(bounds, repeat=2):
+        for exc_min, exc_max in itertools.product((False, True), repeat=2):
+            expected = len(list(p.irange(min_key, max_key, exc_min, exc_max)))
+            count = p.count_range(min_key, max_key, exc_min, exc_max)
+            assert count == expected
+
+
+def test_delete_range():
+    rand = random.Random(0)
+    bounds = (None, -1, 0, 10, 50, 99, 100)
+    for handles, indexed in itertools.product((False, True), repeat=2):
+        items = [(rand.randrange(100), index) for index in range(1000)]
+        for min_key, max_key in itertools.product(bounds, repeat=2):
+            exc_min = rand.random() < 0.5
+            exc_max = rand.random() < 0.5
+            p = Prique()
+            p.init(load=8, handles=handles, indexed=indexed)
+            pairs = [(p.add_left(*item), item) for item in items]
+            removed = set(p.irange(min_key, max_key, exc_min, exc_max))
+            expected = [item for item in p if item not in removed]
+            count = p.delete_range(min_key, max_key, exc_min, exc_max)
+            assert count == len(removed)
+            assert p.check() == 0
+            assert list(p) == expected
+            for handle, item in pairs:
+                if indexed:
+                    assert p.contains(*item) == (item not in removed)
+                if handles:
+                    if item in removed:
+                        with pytest.raises(ValueError):
+                            p.remove(handle)
+                    else:
+                        assert p.remove(handle) == item
+            assert p.check() == 0
+
+
+def test_join_errors():
+    p = Prique()
+    p.init([(0, 0), (5, 5)])
+    q = Prique()
+    q.init([(3, 3)])
+    with pytest.raises(ValueError):
+        p.join(q)
+    with pytest.raises(ValueError):
+        p.join(p)
+    with pytest.raises(TypeError):
+        p.join(None)
+    q.init([(6, 6)], handles=True)
+    with pytest.raises(ValueError):
+        p.join(q)
+    q.init([(6, 6)], load=8)
+    with pytest.raises(ValueError):
+        p.join(q)
+    p.init([(0, 0), (5, 5)], maxlen=3)
+    q.init([(index, index) for index in range(5, 10)])
+    p.join(q)
+    assert list(p) == [(0, 0), (5, 5), (5, 5)]
+    assert q.len() == 0
+
+
+def test_stats():
+    p = Prique()
+    p.init()
+    stats = p.stats()
+    assert stats['total'] == 0
+    assert stats['height'] == 0
+    assert stats['leafs'] == 1
+    assert stats['fill'] == {0: 1}
+    p.init(((index, index) for index in range(10000)), load=8, handles=True)
+    stats = p.stats()
+    assert stats['total'] == 10000
+    assert stats['leafs'] == stats['branches'] + 1
+    assert sum(stats['fill'].values()) == stats['leafs']
+    assert sum(size * count for size, count in stats['fill'].items()) == 10000
+    assert stats['depth_min'] <= stats['depth_max'] == stats['height']
+    assert stats['height'] < 2 * (stats['leafs'].bit_length())
+    assert stats['depth_total'] >= stats['depth_min'] * stats['leafs']
+    assert stats['memory'] > 0
+
+
+@pytest.mark.skipif(
+    not core.__file__.endswith('.py'),
+    reason='counters are compiled out',
+)
+def test_counters(monkeypatch):
+    core.reset_counters()
+    monkeypatch.setattr(core, 'COUNTERS', True)
+    p = Prique()
+    p.init(load=8)
+    for index in range(1000):
+        p.add_left(index, index)
+    p.getitem(500)
+    p.discard(10, 10)
+    counts = core.counters()
+    assert counts['splits'] > 0
+    assert counts['pivots_left'] > 0
+    assert counts['comparisons'] > 0
+    assert counts['descents'] == 2  # Ascending inserts skip descent.
+    monkeypatch.setattr(core, 'COUNTERS', False)
+    p.add_left(0, 0)
+    assert core.counters() == counts
+    core.reset_counters()
+    assert not any(core.counters().values())
+
+
+def test_add_ascending():
+    p = Prique()
+    p.init(load=8, handles=True)
+    for index in range(1000):
+        p.add_left(index, index)
+    assert p.check() == 0
+    fill = p.stats()['fill']
+    assert fill == {6: 1, 7: 142}
+    rand = random.Random(0)
+    keys = [index + rand.randrange(-5, 5) for index in range(1000, 2000)]
+    for key in keys:
+        p.add_left(key, key)
+    assert p.check() == 0
+    assert [key for key, _ in p] == sorted(list(range(1000)) + keys)
+    for _ in range(2000):
+        p.popitem()
+    assert p.check() == 0
+
+
+def test_add_right():
+    rand = random.Random(0)
+    for handles, indexed in itertools.product((False, True), repeat=2):
+        p = Prique()
+        p.init(load=8, handles=handles, indexed=indexed)
+        keys = []
+        values = []
+        for index in range(3000):
+            key = rand.randrange(20) if index % 3 else index // 100
+            if rand.random() < 0.5:
+                pos = bisect.bisect_right(keys, key)
+                p.add_right(key, index)
+            else:
+                pos = bisect.bisect_left(keys, key)
+                p.add_left(key, index)
+            keys.insert(pos, key)
+            values.insert(pos, index)
+        assert p.check() == 0
+        assert list(p) == list(zip(keys, values))
+
+
+def test_add_right_fifo():
+    p = Prique()
+    p.init(load=8)
+    for index in range(1000):
+        p.add_right(index % 10, index)
+    assert p.check() == 0
+    for key in range(10):
+        values = [p.popitem(0)[1] for _ in range(100)]
+        assert values == list(range(key, 1000, 10))
+
+
+def test_add_right_maxlen():
+    p = Prique()
+    p.init(((index, index) for index in range(10)), maxlen=5)
+    assert p.add_right(4, 'x') is None
+    assert p.add_left(4, 'y') is None
+    p.add_right(3, 'z')
+    assert list(p) == [(0, 0), (1, 1), (2, 2), (3, 3), (3, 'z')]
+
+
+def test_change_right():
+    p = Prique()
+    p.init(((index % 5, index) for index in range(50)), handles=True)
+    handle = p.add_left(9, 'x')
+    p.change(handle, 2, right=True)
+    assert p.check() == 0
+    assert p.getitem(p.bisect_right(2) - 1) == (2, 'x')
+    p.change(handle, 2)
+    assert p.check() == 0
+    assert p.getitem(p.bisect_left(2)) == (2, 'x')
+
+
+def test_pool():
+    from prique import core
+
+    p = Prique()
+    p.init(load=8, handles=True, indexed=True)
+    rand = random.Random(0)
+    handles = {}
+    for index in range(20000):
+        key = rand.randrange(1000)
+        handles[index] = p.add_left(key, index)
+        if index % 3 == 0:
+            p.popitem(rand.choice([0, -1]))
+    assert p.check() == 0
+    assert len(p._free_leafs) <= core.POOL_SIZE
+    assert len(p._free_branches) <= core.POOL_SIZE
+    for leaf in p._free_leafs:
+        assert not leaf._keys and not leaf._values and not leaf._handles
+    for handle in handles.values():
+        if handle._leaf is not None:
+            p.remove(handle)
+    assert p.len() == 0
+    assert p.check() == 0
+
+
+class Task:
+    def __init__(self, name, priority):
+        self.name = name
+        self.priority = priority
+
+
+def test_key_function():
+    calls = []
+
+    def key(task):
+        calls.append(task)
+        return task.priority
+
+    rand = random.Random(0)
+    tasks = [Task(index, rand.randrange(100)) for index in range(1000)]
+    p = Prique()
+    p.init(tasks[:500], load=8, key=key)
+    assert len(calls) == 500
+    for task in tasks[500:900]:
+        p.push_left(task)
+    p.update(tasks[900:])
+    assert len(calls) == 1000
+    assert p.check() == 0
+    assert [key for key, _ in p] == sorted(task.priority for task in tasks)
+    assert p.count_range(10, 20) == sum(
+        10 <= task.priority <= 20 for task in tasks
+    )
+    other = p.split(50)
+    assert p.check() == 0 and other.check() == 0
+    for _ in range(100):
+        p.popitem(0)
+        other.popitem()
+    assert len(calls) == 1000
+    other.push_right(Task('x', 99))
+    assert other.peekitem()[1].name == 'x'
+    assert len(calls) == 1001
+
+
+def test_key_discard_change():
+    calls = []
+
+    def key(task):
+        calls.append(task)
+        return task.priority
+
+    tasks = [Task(index, index % 10) for index in range(100)]
+    p = Prique()
+    p.init(tasks, key=key, handles=True, indexed=True)
+    assert p.discard_value(tasks[0])
+    assert not p.discard_value(tasks[0])
+    assert len(calls) == 100
+    task = Task('x', 5)
+    handle = p.push_left(task)
+    task.priority = -1
+    p.change(handle)
+    assert p.check() == 0
+    assert p.peekitem(0) == (-1, task)
+    task.priority = 3
+    p.change(handle, right=True)
+    assert p.getitem(p.bisect_right(3) - 1) == (3, task)
+    assert len(calls) == 103
+
+
+def test_key_discard_mutated():
+    tasks = [Task(index, index % 10) for index in range(100)]
+    p = Prique()
+    p.init(tasks, load=8, key=lambda task: task.priority, indexed=True)
+    tasks[5].priority = 42
+    assert p.discard_value(tasks[5])
+    assert not p.discard_value(tasks[5])
+    assert p.check() == 0
+    assert p.len() == 99
+    assert not p.contains(5, tasks[5])
+
+
+def test_change_without_key():
+    p = Prique()
+    p.init([(1, 'a'), (2, 'b'), (3, 'c')], handles=True)
+    handle = p.add_left(0, 'x')
+    with pytest.raises(TypeError):
+        p.change(handle)
+    assert p.len() == 4
+    assert p.peekitem(0) == (0, 'x')
+    p.change(handle, 5)
+    assert p.peekitem() == (5, 'x')
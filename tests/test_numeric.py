@@ -0,0 +1,175 @@
+import array
+import random
+
+import pytest
+
+from prique.core import Prique
+from prique.numeric import NumericPrique
+
+
+def make(items=(), **options):
+    p = NumericPrique()
+    p.init(items, **options)
+    return p
+
+
+def test_init():
+    p = make()
+    assert p.check() == 0
+    assert p.len() == 0
+    assert list(p) == []
+    with pytest.raises(ValueError):
+        make(key_type='int32')
+    with pytest.raises(ValueError):
+        make(load=2)
+
+
+def test_init_items():
+    rand = random.Random(0)
+    items = [(rand.random(), index) for index in range(1000)]
+    p = make(items, load=16)
+    assert p.check() == 0
+    assert list(p) == sorted(items, key=lambda item: item[0])
+    p = make([(1, 'a'), (0, 'x'), (1, 'b'), (1, 'c')])
+    assert list(p) == [(0, 'x'), (1, 'c'), (1, 'b'), (1, 'a')]
+
+
+def test_int64():
+    p = make([(3, 'c'), (1, 'a')], key_type='int64')
+    p.add_left(2, 'b')
+    assert list(p) == [(1, 'a'), (2, 'b'), (3, 'c')]
+    assert type(p.peekitem(0)[0]) is int
+    with pytest.raises(TypeError):
+        p.add_left(2.5, 'x')
+    with pytest.raises(OverflowError):
+        p.add_left(1 << 64, 'x')
+
+
+def test_float64():
+    p = make(key_type='float64')
+    p.add_left(2, 'b')
+    assert p.peekitem(0) == (2.0, 'b')
+    assert type(p.peekitem(0)[0]) is float
+
+
+def test_add_pop():
+    rand = random.Random(0)
+    p = make(load=8)
+    q = Prique()
+    q.init(load=8)
+    for _ in range(10000):
+        if rand.random() < 0.6 or not q.len():
+            key = float(rand.randrange(100))
+            p.add_left(key, key)
+            q.add_left(key, key)
+        else:
+            index = rand.choice((0, -1, rand.randrange(q.len())))
+            assert p.popitem(index) == q.popitem(index)
+        assert p.len() == q.len()
+        if q.len() and rand.random() < 0.05:
+            index = rand.randrange(q.len())
+            assert p.getitem(index) == q.getitem(index)
+            assert p.check() == 0
+    assert p.check() == 0
+    assert list(p) == list(q)
+    assert list(reversed(p)) == list(reversed(q))
+    with pytest.raises(IndexError):
+        p.getitem(q.len())
+
+
+def test_lifo():
+    p = make(load=4)
+    q = Prique()
+    q.init(load=4)
+    for index in range(100):
+        p.add_left(index % 3, index)
+        q.add_left(index % 3, index)
+    assert list(p) == list(q)
+
+
+def test_discard():
+    rand = random.Random(0)
+    items = [(float(rand.randrange(10)), index) for index in range(500)]
+    p = make(items, load=8)
+    rand.shuffle(items)
+    for key, value in items[:250]:
+        assert p.contains(key, value)
+        assert p.discard(key, value)
+        assert not p.discard(key, value)
+        assert not p.contains(key, value)
+    assert p.check() == 0
+    assert sorted(value for _, value in p) == sorted(
+        value for _, value in items[250:]
+    )
+    for key, value in items[250:]:
+        assert p.discard(key, value)
+    assert p.check() == 0
+    assert p.len() == 0
+    assert not p.discard(0, 0)
+
+
+def test_update():
+    rand = random.Random(0)
+    p = make(load=8)
+    q = Prique()
+    q.init(load=8)
+    for size in (100, 5, 1000, 1):
+        items = [(float(rand.randrange(50)), rand.random()) for _ in range(size)]
+        p.update(items)
+        q.update(items)
+        assert p.check() == 0
+        assert list(p) == list(q)
+
+
+def test_update_arrays():
+    rand = random.Random(0)
+    p = make(key_type='int64', load=8)
+    keys = array.array('q', [rand.randrange(100) for _ in range(1000)])
+    p.update_arrays(keys, range(1000))
+    p.update_arrays([5, 3, 1], ['a', 'b', 'c'])
+    assert p.check() == 0
+    assert p.len() == 1003
+    assert list(p) == sorted(
+        [(5, 'a'), (3, 'b'), (1, 'c')] + list(zip(keys, range(1000)))[::-1],
+        key=lambda item: item[0],
+    )
+    with pytest.raises(ValueError):
+        p.update_arrays([1, 2], [1])
+
+
+def test_ranges():
+    rand = random.Random(0)
+    items = [(float(rand.randrange(100)), index) for index in range(2000)]
+    p = make(items, load=16)
+    q = Prique()
+    q.init(items)
+    bounds = (None, -1, 0, 10, 50, 99, 100)
+    for min_key in bounds:
+        for max_key in bounds:
+            for exc_min in (False, True):
+                for exc_max in (False, True):
+                    args = (min_key, max_key, exc_min, exc_max)
+                    expected = list(q.irange(*args))
+                    assert list(p.irange(*args)) == expected
+                    assert list(p.irange(*args, reverse=True)) == (
+                        expected[::-1]
+                    )
+                    assert p.count_range(*args) == len(expected)
+                    keys, values = p.irange_arrays(*args)
+                    assert keys.typecode == 'd'
+                    assert list(zip(keys, values)) == expected
+    for key in range(-1, 102):
+        assert p.bisect_left(key) == q.bisect_left(key)
+        assert p.bisect_right(key) == q.bisect_right(key)
+
+
+def test_numpy():
+    numpy = pytest.importorskip('numpy')
+    p = make(load=16)
+    keys = numpy.random.default_rng(0).random(1000)
+    p.update_arrays(keys, range(1000))
+    assert p.check() == 0
+    keys, values = p.irange_arrays(0.25, 0.75)
+    keys = numpy.frombuffer(keys, numpy.float64)
+    assert numpy.all(numpy.diff(keys) >= 0)
+    assert len(values) == p.count_range(0.25, 0.75)
@@ -0,0 +1,199 @@
+import random
+import threading
+import time
+
+import pytest
+
+from prique.queue import Empty, Full, PriorityQueue
+
+
+def test_put_get():
+    q = PriorityQueue()
+    rand = random.Random(0)
+    keys = [rand.randrange(100) for _ in range(1000)]
+    for index, key in enumerate(keys):
+        q.put(key, index)
+    assert q.qsize() == 1000
+    assert [q.get()[0] for _ in range(1000)] == sorted(keys)
+    assert q.empty()
+
+
+def test_get_empty():
+    q = PriorityQueue()
+    with pytest.raises(Empty):
+        q.get_nowait()
+    with pytest.raises(Empty):
+        q.get(timeout=0.01)
+    with pytest.raises(Empty):
+        q.get_many(10, block=False)
+    with pytest.raises(Empty):
+        q.peek()
+    with pytest.raises(ValueError):
+        q.get(timeout=-1)
+
+
+def test_maxsize():
+    q = PriorityQueue(maxsize=2)
+    q.put(1, 'a')
+    q.put_nowait(0, 'b')
+    assert q.full()
+    with pytest.raises(Full):
+        q.put_nowait(2, 'c')
+    with pytest.raises(Full):
+        q.put(2, 'c', timeout=0.01)
+    with pytest.raises(Full):
+        q.put_many([(2, 'c')], block=False)
+    assert q.peek() == (0, 'b')
+    assert q.get() == (0, 'b')
+    with pytest.raises(ValueError):
+        PriorityQueue(maxlen=2)
+    with pytest.raises(ValueError):
+        PriorityQueue(key=lambda value: value['p'])
+
+
+def test_put_many_get_many():
+    q = PriorityQueue()
+    q.put_many((index % 10, index) for index in range(100))
+    items = q.get_many(30)
+    assert [key for key, _ in items] == [0] * 10 + [1] * 10 + [2] * 10
+    assert len(q.get_many(1000)) == 70
+
+
+def test_stable():
+    q = PriorityQueue(stable=True, handles=True)
+    for index in range(30):
+        q.put(index % 3, index)
+    q.put_many((index % 3, index) for index in range(30, 60))
+    handle = q.put(5, 'x')
+    q.change(handle, 1)
+    items = q.get_many(100)
+    assert items == (
+        [(0, index) for index in range(0, 60, 3)]
+        + [(1, index) for index in range(1, 60, 3)]
+        + [(1, 'x')]
+        + [(2, index) for index in range(2, 60, 3)]
+    )
+
+
+def test_put_many_tie_order():
+    q = PriorityQueue()
+    q.put_many((index % 3, index) for index in range(30))
+    for index in range(30, 60):
+        q.put(index % 3, index)
+    items = q.get_many(100)
+    assert items == (
+        [(0, index) for index in range(57, -1, -3)]
+        + [(1, index) for index in range(58, 0, -3)]
+        + [(2, index) for index in range(59, 1, -3)]
+    )
+
+
+def test_put_many_bounded():
+    q = PriorityQueue(maxsize=10)
+    results = []
+
+    def consume():
+        while len(results) < 100:
+            results.extend(q.get_many(7))
+
+    thread = threading.Thread(target=consume)
+    thread.start()
+    q.put_many((index, index) for index in range(100))
+    thread.join()
+    assert sorted(results) == [(index, index) for index in range(100)]
+
+
+def test_put_many_full():
+    q = PriorityQueue(maxsize=3)
+    q.put(0, 'a')
+    with pytest.raises(Full):
+        q.put_many([(1, 'b'), (2, 'c'), (3, 'd')], block=False)
+    assert q.qsize() == 1
+    assert q.unfinished_tasks == 1
+    q.put_many([(1, 'b'), (2, 'c')], block=False)
+    assert q.get_many(3) == [(0, 'a'), (1, 'b'), (2, 'c')]
+
+
+def test_put_many_timeout():
+    q = PriorityQueue(maxsize=1)
+    stop = threading.Event()
+
+    def consume():
+        while not stop.wait(0.02):
+            try:
+                q.get_nowait()
+            except Empty:
+                pass
+
+    thread = threading.Thread(target=consume)
+    thread.start()
+    start = time.monotonic()
+    try:
+        with pytest.raises(Full):
+            q.put_many(((index, index) for index in range(100)), timeout=0.1)
+    finally:
+        stop.set()
+        thread.join()
+    assert time.monotonic() - start < 1
+
+
+def test_task_done_join():
+    q = PriorityQueue()
+    for index in range(10):
+        q.put(index, index)
+
+    def work():
+        while True:
+            try:
+                q.get_nowait()
+            except Empty:
+                return
+            q.task_done()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    q.join()
+    for thread in threads:
+        thread.join()
+    with pytest.raises(ValueError):
+        q.task_done()
+
+
+def test_cancel_change():
+    q = PriorityQueue(handles=True)
+    handles = [q.put(index, index) for index in range(10)]
+    assert q.cancel(handles[0]) == (0, 0)
+    q.change(handles[9], -1)
+    assert q.get() == (-1, 9)
+    assert q.irange(3, 5) == [(3, 3), (4, 4), (5, 5)]
+    assert q.qsize() == 8
+    q.get_many(8)
+    with pytest.raises(ValueError):
+        q.change(handles[9], 0)
+
+
+def test_threads():
+    q = PriorityQueue(maxsize=100)
+    results = []
+    lock = threading.Lock()
+
+    def produce(start):
+        for index in range(start, start + 1000):
+            q.put(index % 97, index)
+
+    def consume():
+        for _ in range(1000):
+            item = q.get()
+            with lock:
+                results.append(item)
+            q.task_done()
+
+    threads = [threading.Thread(target=produce, args=(i * 1000,)) for i in range(4)]
+    threads += [threading.Thread(target=consume) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    q.join()
+    for thread in threads:
+        thread.join()
+    assert sorted(value for _, value in results) == list(range(4000))
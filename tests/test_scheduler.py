@@ -0,0 +1,65 @@
+import random
+
+import pytest
+
+from prique.scheduler import Scheduler
+
+
+def test_schedule_pop_due():
+    s = Scheduler()
+    rand = random.Random(0)
+    times = [rand.random() * 100 for _ in range(10000)]
+    for index, when in enumerate(times):
+        s.schedule(when, index)
+    assert len(s) == 10000
+    assert s.next_deadline() == min(times)
+    due = []
+    for now in range(0, 101, 7):
+        items = s.pop_due(now)
+        assert all(when <= now for when, _ in items)
+        assert s.next_deadline() is None or s.next_deadline() > now
+        due.extend(items)
+    due.extend(s.pop_due(100))
+    assert sorted(index for _, index in due) == list(range(10000))
+    assert [when for when, _ in due] == sorted(times)
+    assert len(s) == 0
+    assert s.next_deadline() is None
+    assert s.pop_due(1000) == []
+
+
+def test_cancel_reschedule():
+    s = Scheduler(load=8)
+    handles = [s.schedule(index, index) for index in range(100)]
+    assert s.cancel(handles[0]) == (0, 0)
+    with pytest.raises(ValueError):
+        s.cancel(handles[0])
+    s.reschedule(handles[99], 0.5)
+    assert s.next_deadline() == 0.5
+    assert s.pop_due(1) == [(0.5, 99), (1, 1)]
+    with pytest.raises(ValueError):
+        s.cancel(handles[1])
+    assert s.cancel(handles[50]) == (50, 50)
+    assert len(s) == 96
+
+
+def test_stable():
+    s = Scheduler(stable=True, load=8)
+    handles = [s.schedule(index % 5, index) for index in range(100)]
+    s.reschedule(handles[0], 2)
+    assert s.pop_due(1) == [(0, index) for index in range(5, 100, 5)] + [
+        (1, index) for index in range(1, 100, 5)
+    ]
+    assert s.pop_due(2)[-1] == (2, 0)
+
+
+def test_handles_option():
+    s = Scheduler(handles=True)
+    handle = s.schedule(1, 'a')
+    assert s.cancel(handle) == (1, 'a')
+    with pytest.raises(ValueError):
+        Scheduler(handles=False)
+
+
+def test_maxlen_option():
+    with pytest.raises(ValueError):
+        Scheduler(maxlen=2)
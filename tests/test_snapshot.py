@@ -0,0 +1,114 @@
+import io
+import random
+
+import pytest
+
+from prique import snapshot
+from prique.core import Prique
+
+
+def roundtrip(items):
+    p = Prique()
+    p.init(items)
+    file = io.BytesIO()
+    snapshot.save(p, file)
+    file.seek(0)
+    q = snapshot.load(file)
+    assert q.check() == 0
+    assert list(q) == list(p)
+    return file.getvalue()
+
+
+def test_init_sorted_dump():
+    rand = random.Random(0)
+    items = sorted((rand.randrange(100), index) for index in range(1000))
+    keys = [key for key, _ in items]
+    values = [value for _, value in items]
+    p = Prique()
+    p.init_sorted(keys, values, load=8)
+    assert p.check() == 0
+    assert list(p) == items
+    assert p.dump() == (keys, values)
+
+
+def test_init_sorted_errors():
+    p = Prique()
+    with pytest.raises(ValueError):
+        p.init_sorted([1, 2], [1])
+    with pytest.raises(ValueError):
+        p.init_sorted([1, 2], [1, 1], indexed=True)
+
+
+def test_snapshot_int():
+    rand = random.Random(0)
+    keys = [rand.randrange(-(1 << 63), 1 << 63) for _ in range(1000)]
+    items = [(key, index) for index, key in enumerate(keys)]
+    data = roundtrip(items)
+    assert data[6] == snapshot.INT64
+
+
+def test_snapshot_float():
+    rand = random.Random(0)
+    items = [(rand.random(), str(index)) for index in range(1000)]
+    data = roundtrip(items)
+    assert data[6] == snapshot.FLOAT64
+
+
+def test_snapshot_pickled():
+    rand = random.Random(0)
+    for keys in (
+        [(rand.randrange(10), str(index)) for index in range(100)],
+        [1 << 64, 0, -1],
+        [True, False],
+        [1, 2.5],
+        [],
+    ):
+        items = [(key, index) for index, key in enumerate(keys)]
+        data = roundtrip(items)
+        assert data[6] == snapshot.PICKLED
+
+
+def test_snapshot_options():
+    items = [(index % 10, index) for index in range(1000)]
+    p = Prique()
+    p.init(items)
+    file = io.BytesIO()
+    snapshot.save(p, file)
+    file.seek(0)
+    options = {'load': 8, 'handles': True, 'indexed': True, 'maxlen': 100}
+    q = snapshot.load(file, **options)
+    assert q.check() == 0
+    assert list(q) == list(p)[:100]
+    assert q.contains(0, 0)
+    assert q.contains(0, 990)
+    assert not q.contains(1, 1)
+    assert q.add_left(-1, -1) is not None
+
+
+def test_load_mmap(tmp_path):
+    items = [(index * 7 % 1000, index) for index in range(1000)]
+    p = Prique()
+    p.init(items)
+    path = tmp_path / 'prique.snapshot'
+    with open(path, 'wb') as writer:
+        snapshot.save(p, writer)
+    q = snapshot.load_mmap(path, indexed=True)
+    assert q.check() == 0
+    assert list(q) == list(p)
+
+
+def test_load_errors():
+    p = Prique()
+    p.init((index, index) for index in range(100))
+    file = io.BytesIO()
+    snapshot.save(p, file)
+    data = file.getvalue()
+    for bad in (
+        b'',
+        b'XXXX' + data[4:],
+        data[:4] + b'\x02' + data[5:],
+        data[:6] + b'\x09' + data[7:],
+        data[:-1],
+    ):
+        with pytest.raises(ValueError):
+            snapshot.load(io.BytesIO(bad))
@@ -0,0 +1,177 @@
+import random
+
+import pytest
+
+from prique import spill
+from prique.core import Prique
+from prique.spill import SpillPrique
+
+
+def test_init_errors():
+    with pytest.raises(ValueError):
+        SpillPrique(budget=0)
+    with pytest.raises(ValueError):
+        SpillPrique(page_size=1)
+    with pytest.raises(ValueError):
+        SpillPrique(handles=True)
+
+
+def test_add_pop():
+    rand = random.Random(0)
+    with SpillPrique(budget=100, page_size=32, load=8) as s:
+        items = [(rand.randrange(1000), index) for index in range(2000)]
+        for key, value in items:
+            s.add_left(key, value)
+        assert s.check() == 0
+        assert s.len() == 2000
+        assert len(s._pages) > 2000 // 32
+        assert s._resident <= 100
+        expected = sorted(items, key=lambda item: item[0])
+        assert [key for key, _ in s] == [key for key, _ in expected]
+        for key, _ in expected[:1000]:
+            assert s.popitem(0)[0] == key
+        assert s.check() == 0
+        for key, _ in reversed(expected[1000:]):
+            assert s.popitem()[0] == key
+        assert s.check() == 0
+        assert s.len() == 0
+        with pytest.raises(IndexError):
+            s.popitem(0)
+
+
+def test_lifo():
+    p = Prique()
+    p.init()
+    with SpillPrique(budget=10, page_size=4) as s:
+        for index in range(100):
+            p.add_left(index % 3, index)
+            s.add_left(index % 3, index)
+        assert list(s) == list(p)
+        assert s.check() == 0
+
+
+def test_update():
+    rand = random.Random(0)
+    items = [(rand.random(), index) for index in range(5000)]
+    with SpillPrique(budget=1000, page_size=100) as s:
+        s.update(items)
+        assert s.check() == 0
+        assert s._resident <= 1000
+        s.update(items[:100])
+        assert s.check() == 0
+        assert s.len() == 5100
+        p = Prique()
+        p.init(items + items[:100])
+        assert list(s) == list(p)
+    items = [(index % 3, index) for index in range(300)]
+    with SpillPrique(budget=100, page_size=16) as s:
+        s.update(items)
+        assert s.check() == 0
+        p = Prique()
+        p.init()
+        for key, value in items:
+            p.add_left(key, value)
+        assert list(s) == list(p)
+
+
+def test_getitem():
+    with SpillPrique(budget=50, page_size=16) as s:
+        s.update((index, index) for index in range(1000))
+        for index in (0, 1, 499, 500, 998, 999, -1, -1000):
+            assert s.getitem(index) == (index % 1000, index % 1000)
+        with pytest.raises(IndexError):
+            s.getitem(1000)
+        assert s.check() == 0
+
+
+def test_discard():
+    rand = random.Random(0)
+    with SpillPrique(budget=50, page_size=16) as s:
+        items = [(rand.randrange(10), index) for index in range(500)]
+        s.update(items)
+        rand.shuffle(items)
+        for key, value in items[:250]:
+            assert s.discard(key, value)
+            assert not s.discard(key, value)
+        assert s.check() == 0
+        assert sorted(value for _, value in s) == sorted(
+            value for _, value in items[250:]
+        )
+
+
+def test_ranges():
+    rand = random.Random(0)
+    items = [(rand.randrange(100), index) for index in range(2000)]
+    p = Prique()
+    p.init(items)
+    with SpillPrique(budget=200, page_size=64) as s:
+        s.update(items)
+        bounds = (None, -1, 0, 10, 50, 99, 100)
+        for min_key in bounds:
+            for max_key in bounds:
+                for exc_min in (False, True):
+                    for exc_max in (False, True):
+                        args = (min_key, max_key, exc_min, exc_max)
+                        expected = list(p.irange(*args))
+                        assert list(s.irange(*args)) == expected
+                        assert s.count_range(*args) == len(expected)
+                        reverse = list(s.irange(*args, reverse=True))
+                        assert reverse == expected[::-1]
+        for key in range(-1, 102):
+            assert s.bisect_left(key) == p.bisect_left(key)
+            assert s.bisect_right(key) == p.bisect_right(key)
+        assert s.check() == 0
+
+
+def test_rank_churn():
+    rand = random.Random(0)
+    p = Prique()
+    p.init()
+    with SpillPrique(budget=200, page_size=32) as s:
+        s.update((rand.randrange(1000), index) for index in range(500))
+        items = list(s)
+        p.init_sorted([key for key, _ in items], [value for _, value in items])
+        for index in range(2000):
+            if rand.random() < 0.5:
+                key = rand.randrange(1000)
+                s.add_left(key, index)
+                p.add_left(key, index)
+            else:
+                pos = rand.randrange(p.len())
+                assert s.popitem(pos) == p.popitem(pos)
+            pos = rand.randrange(p.len())
+            assert s.getitem(pos) == p.getitem(pos)
+            key = rand.randrange(1000)
+            assert s.bisect_left(key) == p.bisect_left(key)
+        assert s.check() == 0
+
+
+def test_count_range_spilled():
+    with SpillPrique(budget=100, page_size=64) as s:
+        s.update((index, index) for index in range(10000))
+        spilled = {page for page in s._pages if page.prique is None}
+        assert s.count_range(1024, 2047) == 1024
+        assert {page for page in s._pages if page.prique is None} == spilled
+        assert s.count_range(1000, 2000) == 1001
+        loaded = spilled - {page for page in s._pages if page.prique is None}
+        assert len(loaded) <= 2
+
+
+def test_churn_compact(tmp_path, monkeypatch):
+    monkeypatch.setattr(spill, 'MIN_GARBAGE', 0)
+    path = str(tmp_path / 'spill')
+    rand = random.Random(0)
+    p = Prique()
+    p.init()
+    with SpillPrique(path, budget=200, page_size=32) as s:
+        for _ in range(20000):
+            if rand.random() < 0.6 or not p.len():
+                key = rand.randrange(1000)
+                p.add_left(key, key)
+                s.add_left(key, key)
+            else:
+                assert s.popitem(0) == p.popitem(0)
+        assert s.check() == 0
+        assert list(s) == list(p)
+        assert s._garbage <= s._live
+    assert not (tmp_path / 'spill').exists()